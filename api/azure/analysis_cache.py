@@ -0,0 +1,81 @@
+import copy
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+class AnalysisCache:
+    """In-process LRU cache of normalized Document Intelligence results with a TTL per entry."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> (stored_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(content_hash, model_id):
+        return f"{model_id}:{content_hash}"
+
+    def get(self, content_hash, model_id):
+        if content_hash is None:
+            return None
+        key = self.key(content_hash, model_id)
+        entry = self.entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            if entry is not None:
+                del self.entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        # Callers get their own copy so they can't mutate the cached result
+        return copy.deepcopy(entry[1])
+
+    def set(self, content_hash, model_id, value):
+        if content_hash is None:
+            return
+        key = self.key(content_hash, model_id)
+        self.entries[key] = (time.monotonic(), copy.deepcopy(value))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+def hash_bytes(file_bytes):
+    return hashlib.sha256(file_bytes).hexdigest()
+
+def hash_file(file):
+    """SHA-256 of an uploaded file's contents. The stream is rewound so it can still be uploaded."""
+    return hash_stream(file.stream)
+
+def hash_stream(stream):
+    """SHA-256 of a seekable stream, read in chunks and rewound afterwards."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+analysis_cache = AnalysisCache(
+    max_entries=int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 1000)),
+    ttl_seconds=float(os.environ.get('ANALYSIS_CACHE_TTL_SECONDS', 24 * 60 * 60)),
+)
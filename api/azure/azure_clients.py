@@ -0,0 +1,69 @@
+import aiohttp
+import os
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob.aio import BlobServiceClient
+from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
+import azure_credentials
+
+# Process-wide Azure clients sharing one aiohttp session, so every file in a batch reuses warm connections.
+# Callers must not close these clients (no `async with`); close_clients() does that at shutdown.
+
+HTTP_CONNECTION_LIMIT = int(os.environ.get('AZURE_HTTP_CONNECTION_LIMIT', 100))
+# Uploads larger than the single-put size are sent as staged blocks of this size
+BLOB_MAX_BLOCK_SIZE = int(os.environ.get('BLOB_MAX_BLOCK_SIZE', 4 * 1024 * 1024))
+BLOB_MAX_SINGLE_PUT_SIZE = int(os.environ.get('BLOB_MAX_SINGLE_PUT_SIZE', 8 * 1024 * 1024))
+
+_session = None
+_blob_service_client = None
+_document_intelligence_clients = {}
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_CONNECTION_LIMIT, ttl_dns_cache=300)
+        )
+    return _session
+
+def _transport():
+    # Each client gets its own transport over the shared session; the session outlives the clients
+    return AioHttpTransport(session=_get_session(), session_owner=False)
+
+async def init_clients():
+    get_blob_service_client()
+    get_document_intelligence_client(
+        azure_credentials.FORM_RECOGNIZER_ENDPOINT_PREBUILT, azure_credentials.FORM_RECOGNIZER_KEY_PREBUILT
+    )
+
+def get_blob_service_client():
+    global _blob_service_client
+    if _blob_service_client is None:
+        _blob_service_client = BlobServiceClient.from_connection_string(
+            azure_credentials.CONNECTION_STRING,
+            transport=_transport(),
+            max_block_size=BLOB_MAX_BLOCK_SIZE,
+            max_single_put_size=BLOB_MAX_SINGLE_PUT_SIZE,
+        )
+    return _blob_service_client
+
+def get_document_intelligence_client(endpoint, key):
+    client = _document_intelligence_clients.get((endpoint, key))
+    if client is None:
+        client = DocumentIntelligenceClient(
+            endpoint=endpoint, credential=AzureKeyCredential(key), transport=_transport()
+        )
+        _document_intelligence_clients[(endpoint, key)] = client
+    return client
+
+async def close_clients():
+    global _session, _blob_service_client
+    if _blob_service_client is not None:
+        await _blob_service_client.close()
+        _blob_service_client = None
+    for client in _document_intelligence_clients.values():
+        await client.close()
+    _document_intelligence_clients.clear()
+    if _session is not None:
+        await _session.close()
+        _session = None
@@ -1,55 +1,45 @@
-from azure.storage.blob.aio import BlobServiceClient
 from azure.storage.blob import generate_blob_sas, BlobSasPermissions
-from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
 from azure.ai.documentintelligence.models import AnalyzeResult, AnalyzeDocumentRequest
-from azure.core.credentials import AzureKeyCredential
 import azure_credentials
+from azure_clients import get_blob_service_client, get_document_intelligence_client
 from database import Database
-import json
 import datetime
 import asyncio
 from form_mapping_utils import extractor_model_mapping
+from analysis_cache import analysis_cache
 
 
 class Extractor:
     def __init__(self, container_name):
-        self.blob_service_client = BlobServiceClient.from_connection_string(
-            azure_credentials.CONNECTION_STRING
-        )
+        self.blob_service_client = get_blob_service_client()
         self.blob_container_client = self.blob_service_client.get_container_client(
             container_name
         )
 
     async def update_database(self, client_id, blob_sas_url, doc_name, form_type, extracted_values, access_id):
+        fields = []
+        for doc_index, extracted_value in enumerate(extracted_values):
+            for field_name, field_data in extracted_value.items():
+                if isinstance(field_data, dict):
+                    field_value = str(field_data['value'])
+                    confidence = field_data['confidence']
+                else:
+                    field_value = str(field_data)
+                    confidence = None
+                fields.append((doc_index, field_name, field_value, confidence))
+
         database = Database(client_id, blob_sas_url)
+        # Write errors propagate so the caller reports the file as failed rather than extracted
         try:
-            for extracted_value in extracted_values:
-                for field_name, field_data in extracted_value.items():
-                    if isinstance(field_data, dict):
-                        field_value = str(field_data['value'])
-                        confidence = field_data['confidence']
-                    else:
-                        field_value = str(field_data)
-                        confidence = None
-
-                    # Check if the value is of a custom type and convert it
-                    if isinstance(field_value, list):
-                        field_value = json.dumps(field_value.__dict__)
-
-                    last_inserted_id = await database.post2postgres_extract(
-                        client_id=client_id,
-                        doc_url=blob_sas_url,
-                        doc_name=doc_name,
-                        doc_status='extracted',
-                        doc_type=form_type,
-                        field_name=field_name,
-                        field_value=field_value,
-                        confidence=confidence,
-                        access_id=access_id,
-                    )
-                    print(f"Last inserted ID for extraction: {last_inserted_id}")
-        except Exception as e:
-            print(f"An error occurred while inserting field '{field_name}': {e}")
+            inserted_count = await database.post2postgres_extract_batch(
+                client_id=client_id,
+                doc_url=blob_sas_url,
+                doc_name=doc_name,
+                doc_type=form_type,
+                fields=fields,
+                access_id=access_id,
+            )
+            print(f"Inserted {inserted_count} extracted fields for {doc_name}")
         finally:
             await database.close()
             
@@ -61,10 +51,10 @@ class Extractor:
             endpoint = azure_credentials.FORM_RECOGNIZER_ENDPOINT_CUSTOM
             key = azure_credentials.FORM_RECOGNIZER_KEY_CUSTOM_K1
             
-        return DocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(key))
+        return get_document_intelligence_client(endpoint, key)
       
-    async def extract(self, client_id, blob_name, form_type):
-        document_intelligence_client = self.get_document_intelligence_client(form_type)
+    def get_blob_urls(self, client_id, blob_name):
+        """Returns (read-only SAS URL, plain URL) for a client's blob in this container."""
         blob_location = f"{client_id}/{blob_name}"
         sas_token = generate_blob_sas(
             account_name=self.blob_service_client.account_name,
@@ -77,14 +67,26 @@ class Extractor:
 
         blob_sas_url = f"https://{self.blob_service_client.account_name}.blob.core.windows.net/{self.blob_container_client.container_name}/{blob_location}?{sas_token}"
         doc_url = f"https://{self.blob_service_client.account_name}.blob.core.windows.net/{self.blob_container_client.container_name}/{blob_location}"
+        return blob_sas_url, doc_url
 
-        # Use async with for proper context management of the async client
-        async with document_intelligence_client as client:
-            poller = await client.begin_analyze_document(
-                extractor_model_mapping.get(form_type, 'unsorted'),
-                AnalyzeDocumentRequest(url_source=blob_sas_url)
-            )
-            result: AnalyzeResult = await poller.result()
+    async def extract(self, client_id, blob_name, form_type, content_hash=None):
+        model_id = extractor_model_mapping.get(form_type, 'unsorted')
+        blob_location = f"{client_id}/{blob_name}"
+        blob_sas_url, doc_url = self.get_blob_urls(client_id, blob_name)
+
+        # Identical bytes analyzed with the same model give the same fields, so skip Azure entirely
+        cached_response_list = analysis_cache.get(content_hash, model_id)
+        if cached_response_list is not None:
+            print(f"Analysis cache hit for {blob_location} with model {model_id}")
+            return cached_response_list, doc_url
+
+        document_intelligence_client = self.get_document_intelligence_client(form_type)
+        # Shared client, closed at app shutdown rather than per call
+        poller = await document_intelligence_client.begin_analyze_document(
+            model_id,
+            AnalyzeDocumentRequest(url_source=blob_sas_url)
+        )
+        result: AnalyzeResult = await poller.result()
             
         def extract_address_values(address_value):
             """Extracts individual address components into a dictionary."""
@@ -153,4 +155,5 @@ class Extractor:
             print(w2_dict)
             print("----------------------------------------")
 
+        analysis_cache.set(content_hash, model_id, response_list)
         return response_list, doc_url
@@ -0,0 +1,78 @@
+import os
+import re
+from form_mapping_utils import sorter_form_mapping
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # Embedded-text classification is skipped without pypdf; filename hints still work
+    PdfReader = None
+
+# Only the first pages are read; the form's title or header is almost always there
+LOCAL_CLASSIFIER_MAX_PAGES = int(os.environ.get('LOCAL_CLASSIFIER_MAX_PAGES', 2))
+
+def _build_matcher(form_mapping, whole_words=False):
+    """One combined regex over every sorter keyword, plus a keyword -> form lookup.
+
+    With whole_words a keyword only matches as a separate token, not inside a longer one.
+    """
+    keyword_to_form = {}
+    for form, keywords in form_mapping.items():
+        if not isinstance(keywords, (list, tuple)):
+            continue  # 'None' maps to a bucket name, not keywords
+        for keyword in keywords:
+            keyword_to_form.setdefault(keyword, form)
+    # Longest keywords first so overlapping keywords resolve to the most specific one
+    alternatives = sorted(keyword_to_form, key=len, reverse=True)
+    if not alternatives:
+        return None, keyword_to_form
+    pattern = '|'.join(re.escape(keyword) for keyword in alternatives)
+    if whole_words:
+        # Lookarounds rather than \b, so keywords starting or ending in punctuation still work
+        pattern = rf'(?<!\w)(?:{pattern})(?!\w)'
+    return re.compile(pattern), keyword_to_form
+
+_keyword_pattern, _keyword_to_form = _build_matcher(sorter_form_mapping)
+# A filename hint skips OCR entirely, so it has to name the form as a whole token ("NOW2X" is no W2)
+_filename_pattern, _ = _build_matcher(sorter_form_mapping, whole_words=True)
+
+def match_forms(text, pattern=None):
+    """Set of form types whose keywords appear in the text."""
+    pattern = pattern or _keyword_pattern
+    if not text or pattern is None:
+        return set()
+    return {_keyword_to_form[match.group(0)] for match in pattern.finditer(text)}
+
+def extract_embedded_text(stream):
+    """Text layer of the first pages of a digital PDF, or '' for scans and non-PDFs. Rewinds the stream."""
+    if PdfReader is None:
+        return ''
+    stream.seek(0)
+    try:
+        if stream.read(5) != b'%PDF-':
+            return ''
+        stream.seek(0)
+        reader = PdfReader(stream)
+        page_texts = []
+        for page in reader.pages[:LOCAL_CLASSIFIER_MAX_PAGES]:
+            page_texts.append(page.extract_text() or '')
+        return ' '.join(page_texts)
+    except Exception as e:
+        print(f"Could not read embedded PDF text: {e}")
+        return ''
+    finally:
+        stream.seek(0)
+
+def classify_locally(stream, filename=None):
+    """Form type from the PDF text layer or filename, or None when Azure OCR is needed to decide."""
+    text_forms = match_forms(extract_embedded_text(stream))
+    if len(text_forms) == 1:
+        return next(iter(text_forms))
+    if len(text_forms) > 1:
+        return None  # Ambiguous, let OCR settle it
+
+    if filename:
+        # Treat separators as spaces so "john_W2_2023.pdf" and "Wages-2023.pdf" both match
+        filename_forms = match_forms(re.sub(r'[_\-.]+', ' ', filename), _filename_pattern)
+        if len(filename_forms) == 1:
+            return next(iter(filename_forms))
+    return None
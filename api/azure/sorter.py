@@ -1,29 +1,63 @@
-from azure.ai.documentintelligence.models import AnalyzeResult
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
+from azure.ai.documentintelligence.models import AnalyzeResult, AnalyzeDocumentRequest
 import api.credentials as credentials
+from azure_clients import get_document_intelligence_client
 from form_mapping_utils import sorter_form_mapping
-import io
+from analysis_cache import analysis_cache, hash_stream
+from local_classifier import classify_locally
+import asyncio
+
+SORTER_MODEL_ID = 'prebuilt-read'
 
 class Sorter:
     def __init__(self):
         self.endpoint = credentials.FORM_RECOGNIZER_ENDPOINT_PREBUILT
         self.key = credentials.FORM_RECOGNIZER_KEY_PREBUILT
 
-    async def sort(self, file_stream):
-        file_bytes = io.BytesIO(file_stream.read())
-        file_bytes.seek(0)
+    async def sort(self, file_stream, filename=None):
+        # Digital PDFs and well-named files can be classified without an OCR round trip
+        local_form_type = await asyncio.to_thread(classify_locally, file_stream, filename)
+        if local_form_type is not None:
+            print(f"Local match found: {local_form_type}")
+            return {'form_type': local_form_type}
+
+        # Analyze the caller's stream directly instead of copying it into another buffer
+        content_hash = await asyncio.to_thread(hash_stream, file_stream)
+        cached_result = analysis_cache.get(content_hash, SORTER_MODEL_ID)
+        if cached_result is not None:
+            return cached_result
+
+        # Shared client, closed at app shutdown rather than per call
+        document_intelligence_client = get_document_intelligence_client(self.endpoint, self.key)
+        # Start the document analysis and await its completion
+        poller = await document_intelligence_client.begin_analyze_document(
+            SORTER_MODEL_ID,
+            analyze_request=file_stream,
+            content_type="application/octet-stream",
+        )
+        result: AnalyzeResult = await poller.result()
+
+        sort_result = self.classify(result)
+        analysis_cache.set(content_hash, SORTER_MODEL_ID, sort_result)
+        return sort_result
+
+    async def sort_url(self, blob_sas_url, content_hash=None):
+        """Classify a document that is already in blob storage, so its bytes are not sent twice."""
+        cached_result = analysis_cache.get(content_hash, SORTER_MODEL_ID)
+        if cached_result is not None:
+            return cached_result
+
+        document_intelligence_client = get_document_intelligence_client(self.endpoint, self.key)
+        poller = await document_intelligence_client.begin_analyze_document(
+            SORTER_MODEL_ID,
+            AnalyzeDocumentRequest(url_source=blob_sas_url)
+        )
+        result: AnalyzeResult = await poller.result()
 
-        # Use the asynchronous client with async with for proper context management
-        async with DocumentIntelligenceClient(self.endpoint, AzureKeyCredential(self.key)) as document_intelligence_client:
-            # Start the document analysis and await its completion
-            poller = await document_intelligence_client.begin_analyze_document(
-                "prebuilt-read",
-                analyze_request=file_bytes,
-                content_type="application/octet-stream",
-            )
-            result: AnalyzeResult = await poller.result()
+        sort_result = self.classify(result)
+        analysis_cache.set(content_hash, SORTER_MODEL_ID, sort_result)
+        return sort_result
 
+    def classify(self, result):
         form_type = 'None'
         for page in result.pages:
             for word in page.words:
@@ -39,4 +73,4 @@ class Sorter:
             if form_type != 'None':
                 break  # Break if a form type is found
 
-        return {'form_type': form_type}
\ No newline at end of file
+        return {'form_type': form_type}
@@ -1,19 +1,25 @@
-from azure.storage.blob.aio import BlobServiceClient
-import api.credentials as credentials
+from azure_clients import get_blob_service_client
 from werkzeug.utils import secure_filename
+import os
+
+# Blocks are staged in parallel, so peak memory per file is about block size x concurrency
+UPLOAD_MAX_CONCURRENCY = int(os.environ.get('BLOB_UPLOAD_MAX_CONCURRENCY', 4))
 
 class Uploader:
     def __init__(self, container_name):
-        self.connection_string = credentials.CONNECTION_STRING
         self.container_name = container_name
 
     async def upload(self, client_id, file):
         print("Debug: Received request for upload")
-        async with BlobServiceClient.from_connection_string(self.connection_string) as blob_service_client:
-            blob_container_client = blob_service_client.get_container_client(self.container_name)
-            filename = secure_filename(file.filename)
-            blob_name = f"{client_id}/{filename}"
-            blob_client = blob_container_client.get_blob_client(blob_name)
-            await blob_client.upload_blob(file.read(), overwrite=True)
-            blob_url = blob_client.url
-            return blob_url
+        blob_container_client = get_blob_service_client().get_container_client(self.container_name)
+        filename = secure_filename(file.filename)
+        blob_name = f"{client_id}/{filename}"
+        blob_client = blob_container_client.get_blob_client(blob_name)
+        # Stream from the request's spooled file rather than reading it all into memory
+        stream = file.stream
+        stream.seek(0, os.SEEK_END)
+        length = stream.tell()
+        stream.seek(0)
+        await blob_client.upload_blob(stream, length=length, overwrite=True, max_concurrency=UPLOAD_MAX_CONCURRENCY)
+        blob_url = blob_client.url
+        return blob_url
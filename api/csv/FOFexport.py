@@ -1,11 +1,9 @@
-import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment, PatternFill, Border, Side
+from openpyxl.styles import Alignment, Border, Side
 import numpy as np
 import pandas as pd
-import re
-from io import BytesIO
-from itemcodeoffsets import keyword_to_offset_dict
+from FOFrouting import get_router
+from columnwidths import ColumnWidthTracker
+from amounts import AMOUNT_PATTERN
 
 def get_color_for_value(value):
     color_ranges = [
@@ -25,223 +23,159 @@ def get_color_for_value(value):
             return color
     return 'FFFFFF'  # Default to white if no match
 
-def process_FOF(workbook, fof_sheets):   
-        mappings = {
-            "shippername": 2,
-            "shipperaddress": 3,
-            "shipperphone": 4,
-            "invoicenum": 5,
-            "countrycode": 6,
-            "date": 7,
-            "mawbnum": 8,
-            "hawbnum": 9,
-            "airlineandflightnum": 10,
-            "freightforwarder": 11,
-            "rucnum": 12,
-            "daenum": 13,
-            "incoterm": 14,
-            "consigneename": 15,
-            "consigneeaddress": 16,
-            "consigneecityc": 17,
-            "consigneephone": 18,
-            "consigneecontact": 19,
-            "consigneepostalcode": 20,
-            "fixedprice": 21,
-            "consignment": 22,
-            "piecestype1": 23,
-            "piecestype2": 24,
-            "piecestype3": 25,
-            "piecestype4": 26,
-            "piecestype5": 27,
-            "totalpices1": 28,
-            "totalpices2": 29,
-            "totalpices3": 30,
-            "totalpices4": 31,
-            "totalpices5": 32,
-            "eqfullboxes1": 33,
-            "eqfullboxes2": 34,
-            "eqfullboxes3": 35,
-            "eqfullboxes4": 36,
-            "eqfullboxes5": 37,
-            "product1": 38,
-            "product2": 39,
-            "product3": 40,
-            "product4": 41,
-            "product5": 42,
-            "hits#1": 43,
-            "hits#2": 44,
-            "hits#3": 45,
-            "hits#4": 46,
-            "hits#5": 47,
-            "nandina1": 48,
-            "nandina2": 49,
-            "nandina3": 50,
-            "nandina4": 51,
-            "nandina5": 52,
-            "totalunits1": 53,
-            "totalunits2": 54,
-            "totalunits3": 55,
-            "totalunits4": 56,
-            "totalunits5": 57,
-            "stemsbunch1": 58,
-            "stemsbunch2": 59,
-            "stemsbunch3": 60,
-            "stemsbunch4": 61,
-            "stemsbunch5": 62,
-            "unitprice1": 63,
-            "unitprice2": 64,
-            "unitprice3": 65,
-            "unitprice4": 66,
-            "unitprice5": 67,
-            "totalvalue1": 68,
-            "totalvalue2": 69,
-            "totalvalue3": 70,
-            "totalvalue4": 71,
-            "totalvalue5": 72,
-            "samples": 73,
-            "billto": 74,
-            "shippercontact": 75,
-            "shipperfax": 76,
-            "consigneefax": 77,
-        }
-        
-        target_worksheet = workbook["Sheet1"]
-        
+FIRST_DATA_ROW = 3
+TOTALS_LAST_COLUMN = 299
+ROW_HEIGHT = 25
+FOOTNOTE_COLOR = 'FFFF00'
+HEADER_BORDER = Border(bottom=Side(style='thin'))
+TOTALS_BORDER = Border(top=Side(style='thin'))
+COLUMN_A_ALIGNMENT = Alignment(wrap_text=True, horizontal='center', vertical='center')
+
+def map_fof_rows(fof_rows, router=None):
+    """Maps one document's FOF rows (keyword, item code, amount, confidence) onto FOF_Data columns.
+
+    Returns ({target_col: (amount, fill_color)}, footnoted_target_cols).
+    """
+    router = router or get_router()
+    cells = {}
+    footnoted_items = set()  # (keyword_cell, item_code) pairs marked with '*'
+    footnoted_cols = []
+    invalid_pairs = []
+
+    for row in fof_rows:
+        keyword_cell = row[0] if row else None
+        if not keyword_cell:
+            continue
+        keyword = router.normalize(keyword_cell)
+        if keyword is None:
+            continue
+
+        # Fetch item code associated with keyword instance
+        item_code = row[1] if len(row) > 1 else None
+        if item_code and '*' in item_code:
+            item_code = item_code.replace('*', '')
+            footnoted_items.add((keyword_cell, item_code))  # use original keyword_cell with brackets for later reference
+
+        target_col = router.target_column(keyword, item_code)
+        if target_col is None:
+            invalid_pairs.append((keyword_cell, item_code))
+            continue
+        if (keyword_cell, item_code) in footnoted_items:
+            footnoted_cols.append(target_col)
+
+        amount_cell = row[2] if len(row) > 2 else None
+        confidence_value = row[3] if len(row) > 3 else None  # Extract confidence value
+
+        # Color fill based on confidence value
+        fill_color = None
+        if confidence_value is not None and isinstance(confidence_value, float):
+            fill_color = get_color_for_value(confidence_value)
+        # A later row for the same column replaces the amount but keeps an earlier fill
+        previous_fill = cells.get(target_col, (None, None))[1]
+        cells[target_col] = (amount_cell, fill_color or previous_fill)
+
+    # Reported once per document rather than once per row
+    if invalid_pairs:
+        print(f'Invalid Keyword-Item Code pairings: {invalid_pairs}')
+    return cells, footnoted_cols
+
+def parse_amounts(cells):
+    """Parses a Series of strings as accounting amounts in one vectorized pass. Non-amounts become NaN."""
+    parts = cells.str.extract(AMOUNT_PATTERN)
+    amounts = pd.to_numeric(parts['number'].str.replace(',', '', regex=False), errors='coerce')
+    negative = parts['open'].notna() | parts['minus'].notna()
+    return amounts.where(~negative, -amounts)
+
+def column_totals(cells):
+    """{column: total} of the accounting amounts in a (row, col)-indexed Series, skipping columns without any."""
+    if cells.empty:
+        return {}
+    totals = parse_amounts(cells).groupby(level='col').sum(min_count=1).dropna()
+    return totals.to_dict()
+
+def format_total(value):
+    # Whole totals keep the old integer look; others get at most 6 decimals without trailing zeros
+    value = round(float(value), 6)
+    if value.is_integer():
+        return str(int(value))
+    return np.format_float_positional(value, trim='-')
+
+class FOFGrid:
+    """Sparse contents of the FOF_Data sheet, keyed by (row, column), shared by every FOF exporter."""
+
+    def __init__(self, template_values=None, profile='default', template_widths=None):
+        self.router = get_router(profile)
+        # Values already present in the template count towards max_row and the totals, as they did on the sheet
+        self.values = dict(template_values or {})
+        # Column widths are tracked as values are set; a cached template brings its own precomputed tracker
+        if template_widths is not None:
+            self.widths = template_widths.copy()
+        else:
+            self.widths = ColumnWidthTracker()
+            for (_, col), cell_value in self.values.items():
+                self.widths.track(col, cell_value)
+        self.fills = {}
+        self.borders = {}
+        self.next_row = FIRST_DATA_ROW
+        self.last_data_row = None
+        self.totals_row = None
+
+    @property
+    def max_row(self):
+        return max((row for row, _ in self.values), default=0)
+
+    @property
+    def max_column(self):
+        return max((col for _, col in self.values), default=0)
+
+    def add_header(self):
         # Set the header row
-        target_worksheet["A1"] = "Document Name"
-        for key, value in mappings.items():
-            col_letter = get_column_letter(value + 1)  # Adjust index to match the correct column in Excel
-            target_worksheet[f"{col_letter}1"] = key
-        
+        self.set_value(1, 1, "Document Name")
+        for key, value in self.router.column_mappings.items():
+            self.set_value(1, value + 1, key)  # Adjust index to match the correct column in Excel
         # Add bottom border to row 1
-        border = Border(bottom=Side(style='thin'))
-        for col in range(1, target_worksheet.max_column + 1):
-            cell = target_worksheet.cell(row=1, column=col)
-            cell.border = border
-        
-        starting_row = 3
-
-        for sheet_index, fof_sheet in enumerate(fof_sheets, start=starting_row):
-            # Extracting the sheet name and removing the 'FOF_' prefix
-            sheet_title = fof_sheet.title.replace("FOF_", "")
-            row_number = sheet_index
-            target_worksheet[f'A{row_number}'] = sheet_title
-            
-            #list of lists to store items with footnotes
-            items_with_footnotes = []
-            items_with_target_col = []
-
-            for row in fof_sheet.iter_rows(min_row=1):
-                keyword_cell = row[0].value
-                if keyword_cell:
-                    # Remove brackets from keyword_cell for comparison
-                    keyword_for_comparison = re.sub(r'[\[\]]', '', keyword_cell).strip()
-                    if keyword_for_comparison in mappings:
-                        # Fetch item code associated with keyword instance
-                        item_code = row[1].value
-
-                        if item_code and '*' in item_code:
-                            item_code = item_code.replace('*', '')
-                            items_with_footnotes.append([keyword_cell, item_code, int(sheet_index)])  # use original keyword_cell with brackets for later reference
-
-                        if keyword_for_comparison in keyword_to_offset_dict:
-                            offset_dict = keyword_to_offset_dict[keyword_for_comparison]
-
-                            if item_code in offset_dict:
-                                offset = offset_dict[item_code]
-                                target_col = int(mappings[keyword_for_comparison]) + offset + 1  # Convert to int
-                                print(f'Target col for {keyword_cell} with item code {item_code} is {target_col}')
-                            else:
-                                invalid_item_codes = {keyword_cell: item_code}
-                                print(f'This Keyword-Item Code pairing is invalid: {invalid_item_codes}')
-                                continue
-                        else:
-                            # For keywords without offsets
-                            target_col = int(mappings[keyword_for_comparison]) + 1  # Convert to int
-                        print(f'Final target col: {target_col}, for {keyword_cell} with item code {item_code}')
-                        # Append target col to items_with_target_col matched with base keyword and item code
-                        for item in items_with_footnotes:
-                            if item[0] == keyword_cell and item[1] == item_code:
-                                items_with_target_col.append(item + [target_col])  # Create a new list with target_col
-
-                        amount_cell = row[2].value
-                        confidence_value = row[3].value if len(row) > 3 else None  # Extract confidence value
-                        target_cell = target_worksheet.cell(row=row_number, column=target_col, value=amount_cell)
-
-                        # Apply color fill based on confidence value
-                        if confidence_value is not None and isinstance(confidence_value, float):
-                            color = get_color_for_value(confidence_value)
-                            target_cell.fill = PatternFill(start_color=color, end_color=color, fill_type='solid')
-            print(f'All items with footnotes: {items_with_footnotes}')
-            
-            for keyword_for_comparison, item_code, sheet_index, target_col in items_with_target_col:
-                # Ensure target_row and sheet_index are integers before calling the cell method
-                target_col = int(target_col) if isinstance(target_col, str) else target_col
-                sheet_index = int(sheet_index) if isinstance(sheet_index, str) else sheet_index
-                cell_to_highlight = target_worksheet.cell(row=row_number, column=target_col)
-                cell_to_highlight.fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-                        
-        for row in range(1, target_worksheet.max_row + 1):
-            target_worksheet.row_dimensions[row].height = 25  # Approximate conversion
-            
-        # Find the last row with data
-        last_data_row = target_worksheet.max_row
-
-        # Make Totals Column for Rows 5-300 in Column A, adding a buffer row
-        totals_row = last_data_row + 2
-        border_top = Border(top=Side(style='thin'))
-        
-        # # Set the totals label in the A column
-        # target_worksheet[f"A{totals_row}"] = "Totals"
-                
-        # Make Totals Column for Rows 5-300 in Column A
-        for col_num in range(1, 300):  # End range is exclusive, so 300 to include column 299
-            sum_value = 0  # Initialize sum for the current column
-            for row_num in range(1, last_data_row + 1):  # Start from row 1
-                cell = target_worksheet.cell(row=row_num, column=col_num)
-                cell_value = cell.value
-                # Check if the cell contains a string with parentheses or a negative sign
-                if cell_value is not None:
-                    # Remove commas, parentheses, and negative signs for numeric values
-                    if isinstance(cell_value, str):
-                        cell_value_cleaned = cell_value.replace(',', '').replace('(', '').replace(')', '').replace('-', '')
-                        if cell_value_cleaned.isdigit():
-                            numeric_value = int(cell_value_cleaned)
-                            if '(' in cell_value or '-' in cell_value:
-                                sum_value -= numeric_value
-                            else:
-                                sum_value += numeric_value
-
-            # Update Row 1 with the calculated sum for the current column, converting sum to string, make 0 totals blank
-            if sum_value != 0:
-                target_worksheet.cell(row=totals_row, column=col_num, value=str(sum_value))  # Row 1 is the 1st row
-            else:
-                target_worksheet.cell(row=totals_row, column=col_num, value="")
-        
-            # Apply top border to the totals row
-            cell = target_worksheet.cell(row=totals_row, column=col_num)
-            cell.border = border_top
-                
-        # Adjust column width to fit text
-        for col in target_worksheet.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            target_worksheet.column_dimensions[column].width = adjusted_width        
-
-        # Set text wrap for column A
-        for row in range(1, target_worksheet.max_row + 1):
-            cell = target_worksheet.cell(row=row, column=1)
-            cell.alignment = Alignment(wrap_text=True, horizontal='center', vertical='center')
-            
-        # Set the totals label in the A column
-        target_worksheet[f"A{totals_row}"] = "Totals"
-
-        # Rename the worksheet
-        target_worksheet.title = "FOF_Data"
\ No newline at end of file
+        for col in range(1, self.max_column + 1):
+            self.borders[(1, col)] = HEADER_BORDER
+
+    def add_document(self, title, fof_rows):
+        row_number = self.next_row
+        self.next_row += 1
+        self.set_value(row_number, 1, title)
+        cells, footnoted_cols = map_fof_rows(fof_rows, self.router)
+        for target_col, (amount, fill_color) in cells.items():
+            self.set_value(row_number, target_col, amount)
+            if fill_color is not None:
+                self.fills[(row_number, target_col)] = fill_color
+        for target_col in footnoted_cols:
+            self.fills[(row_number, target_col)] = FOOTNOTE_COLOR
+
+    def add_totals(self):
+        # Totals go below the last row with data, adding a buffer row
+        self.last_data_row = self.max_row
+        self.totals_row = self.last_data_row + 2
+
+        sums = column_totals(self.text_cells())
+
+        # Make 0 totals blank
+        for col in range(1, TOTALS_LAST_COLUMN + 1):
+            sum_value = sums.get(col, 0)
+            self.set_value(self.totals_row, col, format_total(sum_value) if sum_value != 0 else "")
+            self.borders[(self.totals_row, col)] = TOTALS_BORDER
+
+    def text_cells(self):
+        """Text cells of the totals columns as a pandas Series indexed by (row, col)."""
+        text_cells = {
+            key: cell_value for key, cell_value in self.values.items()
+            if key[1] <= TOTALS_LAST_COLUMN and isinstance(cell_value, str)
+        }
+        if not text_cells:
+            return pd.Series(dtype=object)
+        return pd.Series(
+            list(text_cells.values()),
+            index=pd.MultiIndex.from_tuples(list(text_cells.keys()), names=['row', 'col']),
+            dtype=object,
+        )
+
+    def set_value(self, row, col, cell_value):
+        self.values[(row, col)] = cell_value
+        self.widths.track(col, cell_value)
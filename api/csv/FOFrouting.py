@@ -0,0 +1,133 @@
+from itemcodeoffsets import keyword_to_offset_dict
+
+# FOF_Data column (0-based, before the Document Name column) for each FOF keyword
+FOF_COLUMN_MAPPINGS = {
+    "shippername": 2,
+    "shipperaddress": 3,
+    "shipperphone": 4,
+    "invoicenum": 5,
+    "countrycode": 6,
+    "date": 7,
+    "mawbnum": 8,
+    "hawbnum": 9,
+    "airlineandflightnum": 10,
+    "freightforwarder": 11,
+    "rucnum": 12,
+    "daenum": 13,
+    "incoterm": 14,
+    "consigneename": 15,
+    "consigneeaddress": 16,
+    "consigneecityc": 17,
+    "consigneephone": 18,
+    "consigneecontact": 19,
+    "consigneepostalcode": 20,
+    "fixedprice": 21,
+    "consignment": 22,
+    "piecestype1": 23,
+    "piecestype2": 24,
+    "piecestype3": 25,
+    "piecestype4": 26,
+    "piecestype5": 27,
+    "totalpices1": 28,
+    "totalpices2": 29,
+    "totalpices3": 30,
+    "totalpices4": 31,
+    "totalpices5": 32,
+    "eqfullboxes1": 33,
+    "eqfullboxes2": 34,
+    "eqfullboxes3": 35,
+    "eqfullboxes4": 36,
+    "eqfullboxes5": 37,
+    "product1": 38,
+    "product2": 39,
+    "product3": 40,
+    "product4": 41,
+    "product5": 42,
+    "hits#1": 43,
+    "hits#2": 44,
+    "hits#3": 45,
+    "hits#4": 46,
+    "hits#5": 47,
+    "nandina1": 48,
+    "nandina2": 49,
+    "nandina3": 50,
+    "nandina4": 51,
+    "nandina5": 52,
+    "totalunits1": 53,
+    "totalunits2": 54,
+    "totalunits3": 55,
+    "totalunits4": 56,
+    "totalunits5": 57,
+    "stemsbunch1": 58,
+    "stemsbunch2": 59,
+    "stemsbunch3": 60,
+    "stemsbunch4": 61,
+    "stemsbunch5": 62,
+    "unitprice1": 63,
+    "unitprice2": 64,
+    "unitprice3": 65,
+    "unitprice4": 66,
+    "unitprice5": 67,
+    "totalvalue1": 68,
+    "totalvalue2": 69,
+    "totalvalue3": 70,
+    "totalvalue4": 71,
+    "totalvalue5": 72,
+    "samples": 73,
+    "billto": 74,
+    "shippercontact": 75,
+    "shipperfax": 76,
+    "consigneefax": 77,
+}
+
+# Brackets around keywords (e.g. "[totalvalue1]") are ignored when routing
+_BRACKETS = str.maketrans('', '', '[]')
+
+class FOFRouter:
+    """Routing table compiled once per mapping profile: raw FOF keyword + item code -> FOF_Data column."""
+
+    def __init__(self, column_mappings, offset_tables):
+        self.column_mappings = column_mappings
+        # keyword -> target column for keywords that don't depend on an item code
+        self.columns = {}
+        # keyword -> {item_code: target column} for keywords split out by item code
+        self.offset_columns = {}
+        for keyword, column in column_mappings.items():
+            if keyword in offset_tables:
+                self.offset_columns[keyword] = {
+                    item_code: int(column) + offset + 1 for item_code, offset in offset_tables[keyword].items()
+                }
+            else:
+                self.columns[keyword] = int(column) + 1
+        # raw keyword cell -> normalized keyword (or None when unmapped), filled as keywords are seen
+        self._normalized = {}
+
+    def normalize(self, keyword_cell):
+        """Mapped keyword for a raw keyword cell, or None when the keyword isn't routed."""
+        try:
+            return self._normalized[keyword_cell]
+        except KeyError:
+            keyword = keyword_cell.translate(_BRACKETS).strip()
+            if keyword not in self.column_mappings:
+                keyword = None
+            self._normalized[keyword_cell] = keyword
+            return keyword
+
+    def target_column(self, keyword, item_code):
+        """Target column for a normalized keyword and item code, or None for an invalid pairing."""
+        column = self.columns.get(keyword)
+        if column is not None:
+            return column
+        return self.offset_columns.get(keyword, {}).get(item_code)
+
+_routers = {}
+
+def register_profile(name, column_mappings, offset_tables):
+    """Compile and register an alternate mapping profile, e.g. for a different FOF template."""
+    _routers[name] = FOFRouter(column_mappings, offset_tables)
+    return _routers[name]
+
+def get_router(profile='default'):
+    return _routers[profile]
+
+register_profile('default', FOF_COLUMN_MAPPINGS, keyword_to_offset_dict)
@@ -0,0 +1,96 @@
+from copy import copy
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill
+from FOFexport import FOFGrid, ROW_HEIGHT, COLUMN_A_ALIGNMENT
+
+class FOFWorkbookStream:
+    """Builds the FOF batch workbook in openpyxl write-only mode.
+
+    Each document's original and FOF_ sheets are flushed to disk as soon as they are added, and its
+    FOF_Data row is computed straight from the query rows, so memory stays flat with document count.
+    """
+
+    def __init__(self, template=None, profile='default'):
+        self.workbook = Workbook(write_only=True)
+        # Created first so it stays the first sheet; its rows are only written in save()
+        self.fof_worksheet = self.workbook.create_sheet(title="FOF_Data")
+        self.template = template
+        # Template style id -> StyleArray already registered in this workbook
+        self._style_arrays = {}
+        if template is not None:
+            self.grid = FOFGrid(template.values, profile, template.widths)
+        else:
+            self.grid = FOFGrid(profile=profile)
+        self.grid.add_header()
+
+    def add_document(self, name, original_rows, fof_rows):
+        original_sheet = self.workbook.create_sheet(title=name)
+        for row in original_rows:
+            original_sheet.append(row)
+
+        fof_sheet = self.workbook.create_sheet(title=f"FOF_{name}")
+        for row in fof_rows:
+            fof_sheet.append(row)
+
+        self.grid.add_document(name, fof_rows)
+
+    def save(self, output):
+        self.grid.add_totals()
+        self._write_fof_data()
+        self.workbook.save(output)
+
+    def _write_fof_data(self):
+        worksheet = self.fof_worksheet
+        grid = self.grid
+
+        # Write-only sheets need dimensions set before the first row goes out
+        grid.widths.apply(worksheet)
+        for row in range(1, grid.last_data_row + 1):
+            worksheet.row_dimensions[row].height = ROW_HEIGHT
+        if self.template is not None:
+            for merged_range in self.template.merged_ranges:
+                worksheet.merged_cells.add(merged_range)
+
+        grid.values[(grid.totals_row, 1)] = "Totals"
+
+        columns_by_row = {}
+        template_cells = self.template.cells if self.template is not None else ()
+        for row, col in list(grid.values) + list(grid.fills) + list(grid.borders) + list(template_cells):
+            columns_by_row[row] = max(columns_by_row.get(row, 0), col)
+
+        for row in range(1, grid.totals_row + 1):
+            worksheet.append([self._cell(row, col) for col in range(1, columns_by_row.get(row, 1) + 1)])
+
+    def _cell(self, row, col):
+        grid = self.grid
+        cell = WriteOnlyCell(self.fof_worksheet, value=grid.values.get((row, col)))
+
+        if self.template is not None:
+            style_id = self.template.style_ids.get((row, col))
+            if style_id is not None:
+                self._apply_template_style(cell, style_id)
+
+        color = grid.fills.get((row, col))
+        if color is not None:
+            cell.fill = PatternFill(start_color=color, end_color=color, fill_type='solid')
+        border = grid.borders.get((row, col))
+        if border is not None:
+            cell.border = border
+        if col == 1:
+            cell.alignment = COLUMN_A_ALIGNMENT
+        return cell
+
+    def _apply_template_style(self, cell, style_id):
+        style_array = self._style_arrays.get(style_id)
+        if style_array is not None:
+            cell._style = copy(style_array)
+            return
+        font, border, fill, number_format, protection, alignment = self.template.styles[style_id]
+        cell.font = font
+        cell.border = border
+        cell.fill = fill
+        cell.number_format = number_format
+        cell.protection = protection
+        cell.alignment = alignment
+        self._style_arrays[style_id] = copy(cell._style)
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import time
+from copy import copy
+from io import BytesIO
+import openpyxl
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceNotModifiedError
+from columnwidths import ColumnWidthTracker
+
+# How long a cached template is trusted before asking blob storage whether it changed
+TEMPLATE_REFRESH_SECONDS = float(os.environ.get('FOF_TEMPLATE_REFRESH_SECONDS', 60))
+
+class FOFTemplate:
+    """FOF template sheet parsed once into plain values, a deduplicated style table and merged ranges."""
+
+    def __init__(self, worksheet, etag=None):
+        self.etag = etag
+        self.checked_at = time.monotonic()
+        self.values = {}
+        self.widths = ColumnWidthTracker()
+        self.style_ids = {}  # (row, col) -> index into styles
+        self.styles = []  # (font, border, fill, number_format, protection, alignment)
+        style_index = {}
+        for row in worksheet.iter_rows():
+            for cell in row:
+                key = (cell.row, cell.column)
+                if cell.value is not None:
+                    self.values[key] = cell.value
+                    self.widths.track(cell.column, cell.value)
+                if cell.has_style:
+                    # Cells sharing a style share one StyleArray, so each distinct style is copied once
+                    style_key = tuple(cell._style)
+                    if style_key not in style_index:
+                        style_index[style_key] = len(self.styles)
+                        self.styles.append((
+                            copy(cell.font),
+                            copy(cell.border),
+                            copy(cell.fill),
+                            cell.number_format,
+                            copy(cell.protection),
+                            copy(cell.alignment),
+                        ))
+                    self.style_ids[key] = style_index[style_key]
+        self.merged_ranges = [str(merged) for merged in worksheet.merged_cells.ranges]
+
+    @property
+    def cells(self):
+        """Every (row, col) the template defines a value or a style for."""
+        return self.values.keys() | self.style_ids.keys()
+
+_templates = {}  # blob url -> FOFTemplate
+_template_lock = asyncio.Lock()
+
+async def get_fof_template(blob_client, sheet_name='Sheet1'):
+    """Cached FOF template for a blob, re-downloaded only when its ETag changes."""
+    async with _template_lock:
+        cached = _templates.get(blob_client.url)
+        if cached is not None and time.monotonic() - cached.checked_at < TEMPLATE_REFRESH_SECONDS:
+            return cached
+
+        try:
+            if cached is not None:
+                # Conditional GET: only transfers the blob when it changed since we parsed it
+                stream_downloader = await blob_client.download_blob(etag=cached.etag, match_condition=MatchConditions.IfModified)
+            else:
+                stream_downloader = await blob_client.download_blob()
+        except ResourceNotModifiedError:
+            cached.checked_at = time.monotonic()
+            return cached
+
+        template_bytes = await stream_downloader.readall()
+        workbook = await asyncio.to_thread(openpyxl.load_workbook, BytesIO(template_bytes))
+        if sheet_name not in workbook.sheetnames:
+            print(f"The sheet {sheet_name} does not exist in the template workbook.")
+            template = None
+        else:
+            template = FOFTemplate(workbook[sheet_name], etag=stream_downloader.properties.etag)
+            _templates[blob_client.url] = template
+        return template
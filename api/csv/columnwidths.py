@@ -0,0 +1,37 @@
+from openpyxl.utils import get_column_letter
+
+class ColumnWidthTracker:
+    """Longest text length per column, updated as cells are written so widths need no second pass.
+
+    Only string values count towards a column's length; other values just mark the column as used.
+    """
+
+    def __init__(self, padding=2, minimum_length=0):
+        self.padding = padding
+        self.minimum_length = minimum_length
+        self.max_lengths = {}
+
+    def track(self, col, value):
+        length = len(value) if isinstance(value, str) else 0
+        if length > self.max_lengths.get(col, -1):
+            self.max_lengths[col] = length
+
+    def track_row(self, values, start_col=1):
+        for col, value in enumerate(values, start_col):
+            self.track(col, value)
+
+    def copy(self):
+        tracker = ColumnWidthTracker(self.padding, self.minimum_length)
+        tracker.max_lengths = dict(self.max_lengths)
+        return tracker
+
+    def widths(self):
+        return {
+            col: max(length, self.minimum_length) + self.padding
+            for col, length in self.max_lengths.items()
+        }
+
+    def apply(self, worksheet):
+        """Set column widths on a worksheet. Write-only sheets need this before their first row."""
+        for col, width in self.widths().items():
+            worksheet.column_dimensions[get_column_letter(col)].width = width
@@ -0,0 +1,17 @@
+import re
+from decimal import Decimal
+
+# Accounting-format amounts: 1234, 1,234.56, -1,234.56, (1,234.56), $1,234
+AMOUNT_PATTERN = r'^\s*(?P<open>\()?\s*(?P<minus>-)?\s*\$?(?P<number>\d[\d,]*(?:\.\d+)?|\.\d+)\s*\)?\s*$'
+
+_amount_regex = re.compile(AMOUNT_PATTERN)
+
+def parse_amount(value):
+    """Decimal amount of an extracted field value, or None when it isn't an accounting amount."""
+    if value is None:
+        return None
+    match = _amount_regex.match(str(value))
+    if match is None:
+        return None
+    amount = Decimal(match.group('number').replace(',', ''))
+    return -amount if match.group('open') or match.group('minus') else amount
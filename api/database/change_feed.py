@@ -0,0 +1,99 @@
+import asyncio
+import os
+import asyncpg
+from db_pool import POOL_SETTINGS
+
+# Channel the client_docs triggers notify on; the payload is the changed document's client id
+CHANGE_CHANNEL = 'client_docs_changes'
+# Longest wait between attempts to re-open a lost LISTEN connection
+CHANGE_FEED_MAX_RECONNECT_SECONDS = float(os.environ.get('CHANGE_FEED_MAX_RECONNECT_SECONDS', 30))
+
+class ChangeFeed:
+    """One LISTEN connection for the whole process, waking the subscribers of whichever client changed.
+
+    Notifications carry no rows. Subscribers read the changes themselves from their change cursor, so a
+    wake-up that covers several updates loses nothing. A lost connection is re-opened in the background and
+    every subscriber is woken once it is back, to re-read whatever was notified in between.
+    """
+
+    def __init__(self):
+        self.conn = None
+        self.subscribers = {}  # client_id -> set of asyncio.Event
+        self.reconnect_task = None
+        self.reconnects = 0
+        self.closing = False
+
+    async def start(self):
+        self.closing = False
+        await self._connect()
+
+    async def stop(self):
+        self.closing = True
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+            self.reconnect_task = None
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    async def _connect(self):
+        connect_settings = {key: POOL_SETTINGS[key] for key in ('database', 'user', 'password', 'host', 'port')}
+        # A dedicated connection: listeners on pooled connections are dropped when they are released
+        conn = await asyncpg.connect(**connect_settings)
+        try:
+            await conn.add_listener(CHANGE_CHANNEL, self._on_notify)
+        except Exception:
+            await conn.close()
+            raise
+        conn.add_termination_listener(self._on_terminate)
+        self.conn = conn
+
+    def _on_terminate(self, conn):
+        if self.closing or conn is not self.conn or self.reconnect_task is not None:
+            return
+        print("Change feed connection lost, reconnecting")
+        self.reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 1
+        try:
+            while not self.closing:
+                try:
+                    await self._connect()
+                except Exception as e:
+                    print(f"Change feed reconnect failed, retrying in {delay}s: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, CHANGE_FEED_MAX_RECONNECT_SECONDS)
+                    continue
+                self.reconnects += 1
+                # Notifications sent while we were disconnected are gone; have everyone re-read
+                for events in self.subscribers.values():
+                    for event in events:
+                        event.set()
+                return
+        finally:
+            self.reconnect_task = None
+
+    def subscribe(self, client_id):
+        event = asyncio.Event()
+        self.subscribers.setdefault(client_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, client_id, event):
+        events = self.subscribers.get(client_id)
+        if events is not None:
+            events.discard(event)
+            if not events:
+                del self.subscribers[client_id]
+
+    def stats(self):
+        return {
+            'listening': self.conn is not None and not self.conn.is_closed(),
+            'reconnects': self.reconnects,
+            'clients': len(self.subscribers),
+            'subscribers': sum(len(events) for events in self.subscribers.values()),
+        }
+
+    def _on_notify(self, conn, pid, channel, client_id):
+        for event in self.subscribers.get(client_id, ()):
+            event.set()
@@ -1,7 +1,22 @@
-import asyncpg
 import os
 import csv
+import json
 from io import StringIO
+from db_pool import acquire, release
+from amounts import parse_amount
+from queries import query_registry
+from schema import ensure_season_partitions
+
+# Streamed CSV exports are flushed to the client in chunks of about this many characters
+CSV_CHUNK_SIZE = int(os.environ.get('CSV_CHUNK_SIZE', 64 * 1024))
+CSV_CURSOR_PREFETCH = int(os.environ.get('CSV_CURSOR_PREFETCH', 1000))
+
+# 'rows' writes one extracted_fields row per field; 'jsonb' writes one document_field_maps row per analyzed
+# document. Reads go through the document_fields view and see both layouts.
+FIELD_STORAGE_MODE = os.environ.get('FIELD_STORAGE_MODE', 'rows')
+
+# Seasons whose extracted_fields partitions this process has seen committed
+ensured_seasons = set()
 
 class Database:
     def __init__(self, client_id, doc_url):
@@ -14,114 +29,164 @@ class Database:
             await self.connect()
 
     async def connect(self):
-        self.conn = await asyncpg.connect(
-            database="postgres",
-            user="postgres",
-            password="newpassword",
-            host="localhost",
-            port="5432"
-        )
-        await self.create_table()
-
-    async def create_table(self):
-        await self.ensure_connected()
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS client_docs (
-            id SERIAL PRIMARY KEY,
-            client_id TEXT,
-            doc_url TEXT,
-            doc_name TEXT,
-            doc_status TEXT,
-            doc_type TEXT,
-            container_name TEXT,
-            access_id TEXT
-        );
-        """
-        await self.conn.execute(create_table_query)
-        
-        create_extracted_fields_table_query = """
-        CREATE TABLE IF NOT EXISTS extracted_fields (
-            id SERIAL PRIMARY KEY,
-            client_id TEXT,
-            doc_url TEXT,
-            doc_name TEXT,
-            doc_status TEXT,
-            doc_type TEXT,
-            field_name TEXT,
-            field_value TEXT,
-            confidence REAL,
-            access_id TEXT
-        );
-        """
-        await self.conn.execute(create_extracted_fields_table_query)
+        # Schema is applied once at startup by schema.migrate, not per connection
+        self.conn = await acquire()
 
     async def post2postgres_upload(self, client_id, doc_url, doc_status, doc_type, container_name, access_id):
         await self.ensure_connected()
         doc_name = os.path.basename(doc_url)  
-        insert_query = """
-        INSERT INTO client_docs (client_id, doc_url, doc_name, doc_status, doc_type, container_name, access_id)  
-        VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING id;
-        """
-        last_inserted_id = await self.conn.fetchval(insert_query, client_id, doc_url, doc_name, doc_status, doc_type, container_name, access_id)
+        # Uploading the same blob again updates its row rather than adding a second document
+        last_inserted_id = await query_registry.fetchval(
+            self.conn, 'upsert_client_doc', client_id, doc_url, doc_name, doc_status, doc_type, container_name, access_id
+        )
         return last_inserted_id
     
-    async def post2postgres_extract(self, client_id, doc_url, doc_name, doc_status, doc_type, field_name, field_value, confidence, access_id):
-        await self.ensure_connected()
-        insert_query = """
-        INSERT INTO extracted_fields (client_id, doc_url, doc_name, doc_status, doc_type, field_name, field_value, confidence, access_id) 
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9) RETURNING id;
+    async def post2postgres_extract_batch(self, client_id, doc_url, doc_name, doc_type, fields, access_id):
+        """Write all (doc_index, field_name, field_value, confidence) fields of one file in a single transaction.
+
+        doc_index is the position of the analyzed document within the file. FIELD_STORAGE_MODE picks the layout.
+        Writing is idempotent: re-extracting a file replaces its stored fields instead of adding more.
+        Raises ValueError when the document's season has been archived.
         """
-        # Use fetchval to execute the query and get the returned value
-        last_inserted_id = await self.conn.fetchval(insert_query, client_id, doc_url, doc_name, doc_status, doc_type, field_name, field_value, confidence, access_id)
+        await self.ensure_connected()
+        async with self.conn.transaction():
+            # One status update per document rather than one per field; it also gives us the document id
+            doc_id, season = await self.mark_extracted(client_id, doc_url, doc_name, doc_type, access_id)
+            if season not in ensured_seasons:
+                # Startup only prepares this season and the next; a long-running process reaches later ones here
+                await ensure_season_partitions(self.conn, [season])
+            if FIELD_STORAGE_MODE == 'jsonb':
+                await self._write_field_maps(doc_id, season, client_id, fields)
+            else:
+                await self._write_field_rows(doc_id, season, client_id, fields)
+        # Only once committed: a rolled back transaction also rolls back the partitions it created
+        ensured_seasons.add(season)
+        return len(fields)
+
+    async def _write_field_rows(self, doc_id, season, client_id, fields):
+        doc_indexes = [doc_index for doc_index, _, _, _ in fields]
+        field_names = [field_name for _, field_name, _, _ in fields]
+        # A document's fields live in one layout; drop what an earlier jsonb-mode extraction stored
+        await query_registry.execute(self.conn, 'delete_field_maps', doc_id)
+        # Fields the new extraction no longer produces; season and client_id keep this to one partition
+        await query_registry.execute(self.conn, 'delete_stale_fields', doc_id, season, client_id, doc_indexes, field_names)
+        await query_registry.execute(
+            self.conn, 'upsert_fields',
+            doc_id, season, client_id, doc_indexes, field_names,
+            [field_value for _, _, field_value, _ in fields],
+            [confidence for _, _, _, confidence in fields],
+            [parse_amount(field_value) for _, _, field_value, _ in fields],
+        )
+
+    async def _write_field_maps(self, doc_id, season, client_id, fields):
+        field_maps = {}
+        for doc_index, field_name, field_value, confidence in fields:
+            field_map = field_maps.setdefault(doc_index, {})
+            entry = {'v': field_value, 'c': confidence, 'o': len(field_map)}
+            amount = parse_amount(field_value)
+            if amount is not None:
+                entry['a'] = str(amount)
+            field_map[field_name] = entry
+        doc_indexes = list(field_maps)
+        # A document's fields live in one layout; drop what an earlier rows-mode extraction stored
+        await query_registry.execute(self.conn, 'delete_fields', doc_id, season, client_id)
+        await query_registry.execute(self.conn, 'delete_stale_field_maps', doc_id, doc_indexes)
+        # Every analyzed document of the file in one INSERT; re-extraction replaces the maps
+        await query_registry.execute(
+            self.conn, 'upsert_field_maps',
+            doc_id, client_id, doc_indexes, [json.dumps(field_maps[doc_index]) for doc_index in doc_indexes]
+        )
+
+    async def mark_extracted(self, client_id, doc_url, doc_name, doc_type, access_id):
+        """Sets the document's status to extracted and returns its client_docs (id, season).
 
-        update_status_query = """
-        UPDATE client_docs SET doc_status = 'extracted' WHERE client_id = $1 AND doc_url = $2;
+        A document that was never recorded as uploaded gets its row here.
         """
-        # Use execute for the update query as it does not return a value
-        await self.conn.execute(update_status_query, client_id, doc_url)
-        
-        return last_inserted_id
-    
+        record = await query_registry.fetchrow(self.conn, 'mark_extracted', client_id, doc_url, doc_name, doc_type, access_id)
+        return record['id'], record['season']
+
     async def get_field_values(self, client_id, doc_type):
         await self.ensure_connected()
-        query = """
-        SELECT field_name, field_value
-        FROM extracted_fields
-        WHERE client_id = $1 AND doc_type = $2;
-        """
-        rows = await self.conn.fetch(query, client_id, doc_type)
+        rows = await query_registry.fetch(self.conn, 'field_values_by_type', client_id, doc_type)
         return rows
     
-    async def generate_csv(self, document_id, client_id):
+    async def iter_document_csv(self, document_id, client_id):
+        """Yields one document's fields as encoded CSV chunks, read through a server-side cursor."""
         await self.ensure_connected()
-        # Query to fetch all fields and values for a specific document and client
-        query = """ SELECT field_name, field_value, confidence FROM extracted_fields WHERE doc_name = $1 AND client_id = $2"""
-        rows = await self.conn.fetch(query, document_id, client_id)
-        # Initialize CSV output in memory
-        output = StringIO()
-        csv_writer = csv.writer(output)
-
-        # Write the document name in cell A1
-        csv_writer.writerow([f"Document Name: {document_id}"])
-
-        # Write "Field Names" in cell A2 and "Field Values" in cell B2
-        csv_writer.writerow(["Field Names", "Field Values", "Confidence"])
+        header_rows = [
+            # Document name in cell A1, column titles in row 2
+            [f"Document Name: {document_id}"],
+            ["Field Names", "Field Values", "Confidence"],
+        ]
+        async for chunk in self._iter_csv_chunks(header_rows, 'document_fields', document_id, client_id):
+            yield chunk
 
-        # Populate the rest of the columns with field names and their values
-        for row in rows:
-            csv_writer.writerow([row[0], row[1], row[2]])
+    async def iter_client_csv(self, client_id, document_ids=None):
+        """Yields the fields of several documents, or of every document of a client, as encoded CSV chunks.
 
-        # Get the CSV content and reset the pointer
-        csv_content = output.getvalue()
-        output.seek(0)
+        Rows carry their document name in the first column and are grouped by document.
+        """
+        await self.ensure_connected()
+        header_rows = [["Document Name", "Field Names", "Field Values", "Confidence"]]
+        if document_ids is None:
+            chunks = self._iter_csv_chunks(header_rows, 'client_fields', client_id)
+        else:
+            chunks = self._iter_csv_chunks(header_rows, 'documents_fields', list(dict.fromkeys(document_ids)), client_id)
+        async for chunk in chunks:
+            yield chunk
+
+    async def _iter_csv_chunks(self, header_rows, query_name, *args):
+        # Rows are buffered only up to CSV_CHUNK_SIZE characters, so memory stays flat with export size
+        output = StringIO()
+        csv_writer = csv.writer(output)
+        csv_writer.writerows(header_rows)
+        async with self.conn.transaction():
+            async for record in query_registry.cursor(self.conn, query_name, *args, prefetch=CSV_CURSOR_PREFETCH):
+                csv_writer.writerow(record)
+                if output.tell() >= CSV_CHUNK_SIZE:
+                    yield output.getvalue().encode('utf-8')
+                    output.seek(0)
+                    output.truncate(0)
+        if output.tell():
+            yield output.getvalue().encode('utf-8')
 
-        return csv_content
-    
     async def generate_sheet_data(self, document_id, client_id):
         await self.ensure_connected()
-        query = """SELECT field_name, field_value, confidence FROM extracted_fields WHERE doc_name = $1 AND client_id = $2"""
-        rows = await self.conn.fetch(query, document_id, client_id)
+        rows = await query_registry.fetch(self.conn, 'document_fields', document_id, client_id)
+        return self.build_sheet_data(document_id, rows)
+
+    async def iter_sheet_data(self, document_ids, client_id):
+        """Yields (document_id, original_sheet_data, fof_sheet_data) for each requested document, in request order.
 
+        All documents come from one query read through a server-side cursor, so the caller can start on the
+        first document while later rows are still arriving.
+        """
+        await self.ensure_connected()
+        # Duplicate names would only produce duplicate sheets
+        document_ids = list(dict.fromkeys(document_ids))
+        pending_ids = iter(document_ids)
+        current_id = None
+        current_rows = []
+        async with self.conn.transaction():
+            async for doc_name, field_name, field_value, confidence in query_registry.cursor(self.conn, 'documents_fields', document_ids, client_id, prefetch=CSV_CURSOR_PREFETCH):
+                if doc_name != current_id:
+                    if current_id is not None:
+                        yield (current_id, *self.build_sheet_data(current_id, current_rows))
+                    # Documents without any fields still get their (empty) sheets
+                    for document_id in pending_ids:
+                        if document_id == doc_name:
+                            break
+                        yield (document_id, *self.build_sheet_data(document_id, []))
+                    current_id = doc_name
+                    current_rows = []
+                current_rows.append((field_name, field_value, confidence))
+        if current_id is not None:
+            yield (current_id, *self.build_sheet_data(current_id, current_rows))
+        for document_id in pending_ids:
+            yield (document_id, *self.build_sheet_data(document_id, []))
+
+    @staticmethod
+    def build_sheet_data(document_id, rows):
         original_sheet_data = [
             ["Document Name: {}".format(document_id)],
             ["Field Names", "Field Values", "Confidence"]
@@ -180,4 +245,5 @@ class Database:
 
     async def close(self):
         if self.conn is not None:
-            await self.conn.close()
\ No newline at end of file
+            await release(self.conn)
+            self.conn = None
\ No newline at end of file
@@ -0,0 +1,75 @@
+import asyncpg
+import os
+import time
+
+# Pool settings, overridable from the environment
+POOL_SETTINGS = {
+    'database': os.environ.get('PG_DATABASE', 'postgres'),
+    'user': os.environ.get('PG_USER', 'postgres'),
+    'password': os.environ.get('PG_PASSWORD', 'newpassword'),
+    'host': os.environ.get('PG_HOST', 'localhost'),
+    'port': os.environ.get('PG_PORT', '5432'),
+    'min_size': int(os.environ.get('PG_POOL_MIN_SIZE', 2)),
+    'max_size': int(os.environ.get('PG_POOL_MAX_SIZE', 10)),
+    'max_inactive_connection_lifetime': float(os.environ.get('PG_POOL_MAX_IDLE_SECONDS', 300)),
+    'statement_cache_size': int(os.environ.get('PG_STATEMENT_CACHE_SIZE', 100)),
+    'max_cached_statement_lifetime': int(os.environ.get('PG_STATEMENT_CACHE_LIFETIME', 300)),
+}
+
+_pool = None
+
+# Acquire wait-time counters, reported by pool_stats()
+_wait_stats = {
+    'acquires': 0,
+    'total_wait_ms': 0.0,
+    'max_wait_ms': 0.0,
+}
+
+async def create_pool(**overrides):
+    global _pool
+    if _pool is None:
+        settings = {**POOL_SETTINGS, **overrides}
+        _pool = await asyncpg.create_pool(**settings)
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+async def get_pool():
+    # Lazily create the pool for scripts that run outside the Quart app
+    if _pool is None:
+        await create_pool()
+    return _pool
+
+async def acquire():
+    pool = await get_pool()
+    start = time.perf_counter()
+    conn = await pool.acquire()
+    waited_ms = (time.perf_counter() - start) * 1000
+    _wait_stats['acquires'] += 1
+    _wait_stats['total_wait_ms'] += waited_ms
+    _wait_stats['max_wait_ms'] = max(_wait_stats['max_wait_ms'], waited_ms)
+    return conn
+
+async def release(conn):
+    if _pool is not None:
+        await _pool.release(conn)
+
+def pool_stats():
+    acquires = _wait_stats['acquires']
+    stats = {
+        'acquires': acquires,
+        'avg_wait_ms': _wait_stats['total_wait_ms'] / acquires if acquires else 0.0,
+        'max_wait_ms': _wait_stats['max_wait_ms'],
+    }
+    if _pool is not None:
+        stats.update({
+            'size': _pool.get_size(),
+            'idle': _pool.get_idle_size(),
+            'min_size': _pool.get_min_size(),
+            'max_size': _pool.get_max_size(),
+        })
+    return stats
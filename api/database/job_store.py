@@ -0,0 +1,157 @@
+import os
+import socket
+import uuid
+from db_pool import acquire, release
+
+FINISHED_FILE_STATUSES = ('completed', 'error')
+
+# A running job whose owner has not renewed its lease for this long is taken over by another process
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 60))
+
+class JobStore:
+    """Persists background extraction jobs and their per-file progress next to client_docs."""
+
+    def __init__(self, owner=None):
+        # Recorded in jobs.owner; unique per process so a restarted worker never mistakes old jobs for its own
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def _run(self, method, query, *args):
+        # Background jobs are long-lived, so each call holds a pooled connection only for its query
+        conn = await acquire()
+        try:
+            return await getattr(conn, method)(query, *args)
+        finally:
+            await release(conn)
+
+    async def create_job(self, client_id, access_id, files):
+        """Create a job for a list of (file_name, form_type) pairs. Returns (job_id, job_files)."""
+        conn = await acquire()
+        try:
+            async with conn.transaction():
+                job_id = await conn.fetchval(
+                    """
+                    INSERT INTO jobs (client_id, access_id, owner, lease_expires_at)
+                    VALUES ($1, $2, $3, now() + make_interval(secs => $4))
+                    RETURNING id;
+                    """,
+                    client_id, access_id, self.owner, JOB_LEASE_SECONDS
+                )
+                await conn.executemany(
+                    "INSERT INTO job_files (job_id, file_index, file_name, form_type) VALUES ($1, $2, $3, $4);",
+                    [(job_id, index, file_name, form_type) for index, (file_name, form_type) in enumerate(files)]
+                )
+                job_files = await conn.fetch(
+                    "SELECT * FROM job_files WHERE job_id = $1 ORDER BY file_index;", job_id
+                )
+        finally:
+            await release(conn)
+        return job_id, [dict(job_file) for job_file in job_files]
+
+    async def update_file(self, job_file_id, status, blob_url=None, error=None):
+        await self._run(
+            'execute',
+            """
+            UPDATE job_files
+            SET status = $2, blob_url = COALESCE($3, blob_url), error = $4, updated_at = now()
+            WHERE id = $1;
+            """,
+            job_file_id, status, blob_url, error
+        )
+
+    async def finish_job(self, job_id):
+        """Mark the job finished once none of its files are still in progress."""
+        await self._run(
+            'execute',
+            """
+            UPDATE jobs SET status = 'finished', updated_at = now()
+            WHERE id = $1 AND NOT EXISTS (
+                SELECT 1 FROM job_files WHERE job_id = $1 AND status <> ALL($2::text[])
+            );
+            """,
+            job_id, list(FINISHED_FILE_STATUSES)
+        )
+
+    async def get_job(self, job_id):
+        job = await self._run('fetchrow', "SELECT * FROM jobs WHERE id = $1;", job_id)
+        if job is None:
+            return None
+        job_files = await self._run(
+            'fetch',
+            "SELECT file_index, file_name, form_type, status, error FROM job_files WHERE job_id = $1 ORDER BY file_index;",
+            job_id
+        )
+        files = [dict(job_file) for job_file in job_files]
+        return {
+            'job_id': job['id'],
+            'client_id': job['client_id'],
+            'status': job['status'],
+            'created_at': job['created_at'].isoformat(),
+            'updated_at': job['updated_at'].isoformat(),
+            'completed': sum(1 for job_file in files if job_file['status'] in FINISHED_FILE_STATUSES),
+            'total': len(files),
+            'files': files,
+        }
+
+    async def renew_leases(self):
+        """Extend the lease on every running job this process owns. Call well within JOB_LEASE_SECONDS."""
+        await self._run(
+            'execute',
+            """
+            UPDATE jobs SET lease_expires_at = now() + make_interval(secs => $2)
+            WHERE owner = $1 AND status = 'running';
+            """,
+            self.owner, JOB_LEASE_SECONDS
+        )
+
+    async def claim_unfinished_jobs(self):
+        """Take over running jobs whose lease expired, with the files that still need work.
+
+        Used to resume jobs after a restart, or after another worker stopped. Jobs another live process owns are
+        left alone, and SKIP LOCKED keeps two processes claiming at once from taking the same job.
+        """
+        # Jobs whose last file finished right before a shutdown never got marked finished
+        await self._run(
+            'execute',
+            """
+            UPDATE jobs j SET status = 'finished', updated_at = now()
+            WHERE j.status = 'running' AND NOT EXISTS (
+                SELECT 1 FROM job_files f WHERE f.job_id = j.id AND f.status <> ALL($1::text[])
+            );
+            """,
+            list(FINISHED_FILE_STATUSES)
+        )
+        claimed = await self._run(
+            'fetch',
+            """
+            UPDATE jobs SET owner = $1, lease_expires_at = now() + make_interval(secs => $2), updated_at = now()
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < now())
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id;
+            """,
+            self.owner, JOB_LEASE_SECONDS
+        )
+        if not claimed:
+            return []
+        rows = await self._run(
+            'fetch',
+            """
+            SELECT j.id AS job_id, j.client_id, j.access_id, f.*
+            FROM jobs j JOIN job_files f ON f.job_id = j.id
+            WHERE j.id = ANY($1::integer[]) AND f.status <> ALL($2::text[])
+            ORDER BY j.id, f.file_index;
+            """,
+            [record['id'] for record in claimed], list(FINISHED_FILE_STATUSES)
+        )
+        jobs = {}
+        for row in rows:
+            job = jobs.setdefault(row['job_id'], {
+                'job_id': row['job_id'],
+                'client_id': row['client_id'],
+                'access_id': row['access_id'],
+                'files': [],
+            })
+            job['files'].append(dict(row))
+        return list(jobs.values())
@@ -0,0 +1,144 @@
+import time
+
+# Every fixed statement the Database layer sends, by name
+QUERIES = {
+    'upsert_client_doc': """
+    INSERT INTO client_docs (client_id, doc_url, doc_name, doc_status, doc_type, container_name, access_id)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+    ON CONFLICT (client_id, doc_url) DO UPDATE SET
+        doc_name = EXCLUDED.doc_name,
+        doc_status = EXCLUDED.doc_status,
+        doc_type = EXCLUDED.doc_type,
+        container_name = EXCLUDED.container_name,
+        access_id = EXCLUDED.access_id
+    RETURNING id;
+    """,
+    'mark_extracted': """
+    INSERT INTO client_docs (client_id, doc_url, doc_name, doc_status, doc_type, access_id)
+    VALUES ($1, $2, $3, 'extracted', $4, $5)
+    ON CONFLICT (client_id, doc_url) DO UPDATE SET doc_status = 'extracted'
+    RETURNING id, season;
+    """,
+    'delete_stale_fields': """
+    DELETE FROM extracted_fields
+    WHERE doc_id = $1 AND season = $2 AND client_id = $3
+        AND (doc_index, field_name) NOT IN (SELECT * FROM unnest($4::integer[], $5::text[]));
+    """,
+    'upsert_fields': """
+    INSERT INTO extracted_fields (doc_id, season, client_id, doc_index, field_name, field_value, confidence, amount)
+    SELECT $1, $2, $3, new.* FROM unnest($4::integer[], $5::text[], $6::text[], $7::real[], $8::numeric[])
+        AS new (doc_index, field_name, field_value, confidence, amount)
+    ON CONFLICT (client_id, season, doc_id, doc_index, field_name) DO UPDATE SET
+        field_value = EXCLUDED.field_value,
+        confidence = EXCLUDED.confidence,
+        amount = EXCLUDED.amount;
+    """,
+    'delete_fields': """
+    DELETE FROM extracted_fields WHERE doc_id = $1 AND season = $2 AND client_id = $3;
+    """,
+    'delete_field_maps': """
+    DELETE FROM document_field_maps WHERE doc_id = $1;
+    """,
+    'delete_stale_field_maps': """
+    DELETE FROM document_field_maps WHERE doc_id = $1 AND doc_index <> ALL($2::integer[]);
+    """,
+    'upsert_field_maps': """
+    INSERT INTO document_field_maps (doc_id, doc_index, client_id, fields)
+    SELECT $1, doc_index, $2, fields FROM unnest($3::integer[], $4::jsonb[]) AS maps (doc_index, fields)
+    ON CONFLICT (doc_id, doc_index) DO UPDATE SET fields = EXCLUDED.fields;
+    """,
+    'field_values_by_type': """
+    SELECT f.field_name, f.field_value
+    FROM document_fields f
+    JOIN client_docs d ON d.id = f.doc_id
+    WHERE d.client_id = $1 AND f.client_id = $1 AND d.doc_type = $2;
+    """,
+    'document_fields': """
+    SELECT f.field_name, f.field_value, f.confidence
+    FROM client_docs d
+    JOIN document_fields f ON f.doc_id = d.id
+    WHERE d.doc_name = $1 AND d.client_id = $2 AND f.client_id = $2
+    ORDER BY f.doc_index, f.ordinal
+    """,
+    'client_fields': """
+    SELECT d.doc_name, f.field_name, f.field_value, f.confidence
+    FROM client_docs d
+    JOIN document_fields f ON f.doc_id = d.id
+    WHERE d.client_id = $1 AND f.client_id = $1
+    ORDER BY d.doc_name, f.doc_index, f.ordinal
+    """,
+    'documents_fields': """
+    SELECT d.doc_name, f.field_name, f.field_value, f.confidence
+    FROM client_docs d
+    JOIN document_fields f ON f.doc_id = d.id
+    WHERE d.client_id = $2 AND f.client_id = $2 AND d.doc_name = ANY($1::text[])
+    ORDER BY array_position($1::text[], d.doc_name), f.doc_index, f.ordinal
+    """,
+}
+
+class QueryRegistry:
+    """Runs named statements and keeps per-statement call counts and latency.
+
+    Statement reuse is left to asyncpg's per-connection statement cache: pooled connections keep it across
+    checkouts, and it re-prepares statements a schema change invalidated. PreparedStatement objects are not
+    kept here because they cannot be used again once their connection goes back to the pool.
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+        self.counters = {
+            name: {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            for name in queries
+        }
+
+    async def fetch(self, conn, name, *args):
+        return await self._run(conn.fetch, name, args)
+
+    async def fetchrow(self, conn, name, *args):
+        return await self._run(conn.fetchrow, name, args)
+
+    async def fetchval(self, conn, name, *args):
+        return await self._run(conn.fetchval, name, args)
+
+    async def execute(self, conn, name, *args):
+        return await self._run(conn.execute, name, args)
+
+    async def cursor(self, conn, name, *args, prefetch=None):
+        """Iterates a server-side cursor over a named statement. Must run inside a transaction.
+
+        Latency covers the whole iteration, including time the caller spends between rows.
+        """
+        start = time.perf_counter()
+        try:
+            async for record in conn.cursor(self.queries[name], *args, prefetch=prefetch):
+                yield record
+        except Exception:
+            self.counters[name]['errors'] += 1
+            raise
+        finally:
+            self._record(name, start)
+
+    async def _run(self, method, name, args):
+        start = time.perf_counter()
+        try:
+            return await method(self.queries[name], *args)
+        except Exception:
+            self.counters[name]['errors'] += 1
+            raise
+        finally:
+            self._record(name, start)
+
+    def _record(self, name, start):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        counters = self.counters[name]
+        counters['calls'] += 1
+        counters['total_ms'] += elapsed_ms
+        counters['max_ms'] = max(counters['max_ms'], elapsed_ms)
+
+    def stats(self):
+        return {
+            name: {**counters, 'avg_ms': counters['total_ms'] / counters['calls'] if counters['calls'] else 0.0}
+            for name, counters in self.counters.items()
+        }
+
+query_registry = QueryRegistry(QUERIES)
@@ -0,0 +1,505 @@
+import asyncio
+import sys
+from db_pool import create_pool, close_pool, acquire, release
+
+# Hash partitions per season of extracted_fields. Fixed once migration 9 has run.
+CLIENT_PARTITIONS = 8
+
+# Ordered schema migrations. Append new (version, statements) entries; never edit applied ones.
+MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS client_docs (
+            id SERIAL PRIMARY KEY,
+            client_id TEXT,
+            doc_url TEXT,
+            doc_name TEXT,
+            doc_status TEXT,
+            doc_type TEXT,
+            container_name TEXT,
+            access_id TEXT
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS extracted_fields (
+            id SERIAL PRIMARY KEY,
+            client_id TEXT,
+            doc_url TEXT,
+            doc_name TEXT,
+            doc_status TEXT,
+            doc_type TEXT,
+            field_name TEXT,
+            field_value TEXT,
+            confidence REAL,
+            access_id TEXT
+        );
+        """,
+    ]),
+    (2, [
+        "CREATE INDEX IF NOT EXISTS extracted_fields_client_doc_name_idx ON extracted_fields (client_id, doc_name);",
+        "CREATE INDEX IF NOT EXISTS extracted_fields_client_doc_type_idx ON extracted_fields (client_id, doc_type);",
+        "CREATE INDEX IF NOT EXISTS client_docs_client_doc_url_idx ON client_docs (client_id, doc_url);",
+    ]),
+    (3, [
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id SERIAL PRIMARY KEY,
+            client_id TEXT NOT NULL,
+            access_id TEXT,
+            status TEXT NOT NULL DEFAULT 'running',
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS job_files (
+            id SERIAL PRIMARY KEY,
+            job_id INTEGER NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+            file_index INTEGER NOT NULL,
+            file_name TEXT NOT NULL,
+            form_type TEXT NOT NULL,
+            blob_url TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            error TEXT,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS job_files_job_id_idx ON job_files (job_id, file_index);",
+        "CREATE INDEX IF NOT EXISTS jobs_running_idx ON jobs (id) WHERE status = 'running';",
+    ]),
+    (4, [
+        # Keyset pagination for the client document table, by id or by (status/type, id)
+        "CREATE INDEX IF NOT EXISTS client_docs_client_id_idx ON client_docs (client_id, id);",
+        "CREATE INDEX IF NOT EXISTS client_docs_client_status_idx ON client_docs (client_id, (COALESCE(doc_status, '')), id);",
+        "CREATE INDEX IF NOT EXISTS client_docs_client_type_idx ON client_docs (client_id, (COALESCE(doc_type, '')), id);",
+    ]),
+    (5, [
+        # Change feed: every insert or update of a client document takes the next change_seq and notifies listeners
+        "CREATE SEQUENCE IF NOT EXISTS client_docs_change_seq;",
+        """
+        ALTER TABLE client_docs
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            ADD COLUMN IF NOT EXISTS change_seq BIGINT NOT NULL DEFAULT nextval('client_docs_change_seq');
+        """,
+        "CREATE INDEX IF NOT EXISTS client_docs_client_change_seq_idx ON client_docs (client_id, change_seq);",
+        """
+        CREATE OR REPLACE FUNCTION client_docs_touch() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_seq := nextval('client_docs_change_seq');
+            NEW.updated_at := now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        """
+        CREATE OR REPLACE FUNCTION client_docs_notify() RETURNS trigger AS $$
+        BEGIN
+            -- Only the client id is sent; listeners read the rows themselves, by change_seq
+            PERFORM pg_notify('client_docs_changes', NEW.client_id);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS client_docs_touch_trigger ON client_docs;",
+        """
+        CREATE TRIGGER client_docs_touch_trigger BEFORE INSERT OR UPDATE ON client_docs
+            FOR EACH ROW EXECUTE FUNCTION client_docs_touch();
+        """,
+        "DROP TRIGGER IF EXISTS client_docs_notify_trigger ON client_docs;",
+        """
+        CREATE TRIGGER client_docs_notify_trigger AFTER INSERT OR UPDATE ON client_docs
+            FOR EACH ROW EXECUTE FUNCTION client_docs_notify();
+        """,
+    ]),
+    (6, [
+        # Field rows reference their client_docs row instead of repeating the document's columns
+        """
+        ALTER TABLE extracted_fields
+            ADD COLUMN IF NOT EXISTS doc_id INTEGER REFERENCES client_docs (id) ON DELETE CASCADE,
+            ADD COLUMN IF NOT EXISTS amount NUMERIC;
+        """,
+        # Fields extracted without a recorded upload get a document row of their own. Keys are matched with =
+        # so the joins can hash; the few rows with a NULL client_id or doc_url get their own pass after each step.
+        """
+        INSERT INTO client_docs (client_id, doc_url, doc_name, doc_status, doc_type, access_id)
+        SELECT DISTINCT ON (ef.client_id, ef.doc_url) ef.client_id, ef.doc_url, ef.doc_name, 'extracted', ef.doc_type, ef.access_id
+        FROM extracted_fields ef
+        WHERE ef.client_id IS NOT NULL AND ef.doc_url IS NOT NULL
+            AND NOT EXISTS (
+                SELECT 1 FROM client_docs cd
+                WHERE cd.client_id = ef.client_id AND cd.doc_url = ef.doc_url
+            )
+        ORDER BY ef.client_id, ef.doc_url, ef.id;
+        """,
+        """
+        INSERT INTO client_docs (client_id, doc_url, doc_name, doc_status, doc_type, access_id)
+        SELECT DISTINCT ON (ef.client_id, ef.doc_url) ef.client_id, ef.doc_url, ef.doc_name, 'extracted', ef.doc_type, ef.access_id
+        FROM extracted_fields ef
+        WHERE (ef.client_id IS NULL OR ef.doc_url IS NULL)
+            AND NOT EXISTS (
+                SELECT 1 FROM client_docs cd
+                WHERE (cd.client_id IS NULL OR cd.doc_url IS NULL)
+                    AND cd.client_id IS NOT DISTINCT FROM ef.client_id AND cd.doc_url IS NOT DISTINCT FROM ef.doc_url
+            )
+        ORDER BY ef.client_id, ef.doc_url, ef.id;
+        """,
+        # Same rule as the extraction write: the latest document row for the URL
+        """
+        UPDATE extracted_fields ef SET doc_id = cd.id
+        FROM (
+            SELECT client_id, doc_url, MAX(id) AS id FROM client_docs
+            WHERE client_id IS NOT NULL AND doc_url IS NOT NULL
+            GROUP BY client_id, doc_url
+        ) cd
+        WHERE cd.client_id = ef.client_id AND cd.doc_url = ef.doc_url;
+        """,
+        """
+        UPDATE extracted_fields ef SET doc_id = cd.id
+        FROM (
+            SELECT client_id, doc_url, MAX(id) AS id FROM client_docs
+            WHERE client_id IS NULL OR doc_url IS NULL
+            GROUP BY client_id, doc_url
+        ) cd
+        WHERE (ef.client_id IS NULL OR ef.doc_url IS NULL)
+            AND cd.client_id IS NOT DISTINCT FROM ef.client_id AND cd.doc_url IS NOT DISTINCT FROM ef.doc_url;
+        """,
+        # Same accounting formats as amounts.parse_amount
+        r"""
+        UPDATE extracted_fields
+        SET amount = CASE WHEN field_value ~ '^\s*[(-]' THEN -1 ELSE 1 END
+            * replace(substring(field_value FROM '^\s*\(?\s*-?\s*\$?(\d[\d,]*(?:\.\d+)?|\.\d+)\s*\)?\s*$'), ',', '')::numeric
+        WHERE field_value ~ '^\s*\(?\s*-?\s*\$?(\d[\d,]*(?:\.\d+)?|\.\d+)\s*\)?\s*$';
+        """,
+        "ALTER TABLE extracted_fields ALTER COLUMN doc_id SET NOT NULL;",
+        """
+        ALTER TABLE extracted_fields
+            DROP COLUMN IF EXISTS doc_url,
+            DROP COLUMN IF EXISTS doc_name,
+            DROP COLUMN IF EXISTS doc_status,
+            DROP COLUMN IF EXISTS doc_type,
+            DROP COLUMN IF EXISTS access_id;
+        """,
+        "CREATE INDEX IF NOT EXISTS extracted_fields_doc_id_idx ON extracted_fields (doc_id, id);",
+        "CREATE INDEX IF NOT EXISTS extracted_fields_client_id_idx ON extracted_fields (client_id);",
+        "CREATE INDEX IF NOT EXISTS client_docs_client_doc_name_idx ON client_docs (client_id, doc_name);",
+    ]),
+    (7, [
+        # FIELD_STORAGE_MODE=jsonb: one row per analyzed document, fields as {name: {"v": value, "c": confidence, "o": ordinal, "a": amount}}
+        """
+        CREATE TABLE IF NOT EXISTS document_field_maps (
+            doc_id INTEGER NOT NULL REFERENCES client_docs (id) ON DELETE CASCADE,
+            doc_index INTEGER NOT NULL,
+            client_id TEXT,
+            fields JSONB NOT NULL,
+            PRIMARY KEY (doc_id, doc_index)
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS document_field_maps_fields_idx ON document_field_maps USING GIN (fields);",
+        "CREATE INDEX IF NOT EXISTS document_field_maps_client_id_idx ON document_field_maps (client_id);",
+        # Both layouts as field rows; readers order by (doc_index, ordinal)
+        """
+        CREATE OR REPLACE VIEW document_fields AS
+        SELECT f.doc_id, f.client_id, 0 AS doc_index, f.id::BIGINT AS ordinal,
+               f.field_name, f.field_value, f.confidence, f.amount
+        FROM extracted_fields f
+        UNION ALL
+        SELECT m.doc_id, m.client_id, m.doc_index, (e.value->>'o')::BIGINT,
+               e.key, e.value->>'v', (e.value->>'c')::REAL, (e.value->>'a')::NUMERIC
+        FROM document_field_maps m
+        CROSS JOIN LATERAL jsonb_each(m.fields) e;
+        """,
+    ]),
+    (8, [
+        # One client_docs row per blob: re-uploads fold into the newest row, which takes over their fields
+        """
+        CREATE TEMP TABLE client_docs_merge ON COMMIT DROP AS
+        SELECT id, keep_id, doc_status FROM (
+            SELECT id, doc_status, MAX(id) OVER (PARTITION BY client_id, doc_url) AS keep_id
+            FROM client_docs
+            WHERE doc_url IS NOT NULL
+        ) versions
+        WHERE id <> keep_id;
+        """,
+        "UPDATE extracted_fields f SET doc_id = m.keep_id FROM client_docs_merge m WHERE f.doc_id = m.id;",
+        # Field maps only move where the surviving row has none for that doc_index; the rest cascade away
+        """
+        UPDATE document_field_maps dm SET doc_id = src.keep_id
+        FROM (
+            SELECT DISTINCT ON (m.keep_id, old.doc_index) old.doc_id, old.doc_index, m.keep_id
+            FROM document_field_maps old
+            JOIN client_docs_merge m ON m.id = old.doc_id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM document_field_maps kept WHERE kept.doc_id = m.keep_id AND kept.doc_index = old.doc_index
+            )
+            ORDER BY m.keep_id, old.doc_index, old.doc_id DESC
+        ) src
+        WHERE dm.doc_id = src.doc_id AND dm.doc_index = src.doc_index;
+        """,
+        """
+        UPDATE client_docs SET doc_status = 'extracted'
+        WHERE id IN (SELECT keep_id FROM client_docs_merge WHERE doc_status = 'extracted') AND doc_status <> 'extracted';
+        """,
+        "DELETE FROM client_docs WHERE id IN (SELECT id FROM client_docs_merge);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS client_docs_client_doc_url_key ON client_docs (client_id, doc_url);",
+        "DROP INDEX IF EXISTS client_docs_client_doc_url_idx;",
+        # Position of the analyzed document within its file. Existing repeats of a field are numbered in id
+        # order so no value is lost; the next extraction of the file replaces them.
+        "ALTER TABLE extracted_fields ADD COLUMN IF NOT EXISTS doc_index INTEGER NOT NULL DEFAULT 0;",
+        """
+        UPDATE extracted_fields f SET doc_index = numbered.doc_index
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY doc_id, field_name ORDER BY id) - 1 AS doc_index
+            FROM extracted_fields
+        ) numbered
+        WHERE f.id = numbered.id AND numbered.doc_index > 0;
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS extracted_fields_field_key ON extracted_fields (client_id, doc_id, doc_index, field_name);",
+        """
+        CREATE OR REPLACE VIEW document_fields AS
+        SELECT f.doc_id, f.client_id, f.doc_index, f.id::BIGINT AS ordinal,
+               f.field_name, f.field_value, f.confidence, f.amount
+        FROM extracted_fields f
+        UNION ALL
+        SELECT m.doc_id, m.client_id, m.doc_index, (e.value->>'o')::BIGINT,
+               e.key, e.value->>'v', (e.value->>'c')::REAL, (e.value->>'a')::NUMERIC
+        FROM document_field_maps m
+        CROSS JOIN LATERAL jsonb_each(m.fields) e;
+        """,
+    ]),
+    (9, [
+        # A document's season is the year it was first recorded; its fields are stored in that season's partition
+        "ALTER TABLE client_docs ADD COLUMN IF NOT EXISTS season INTEGER NOT NULL DEFAULT EXTRACT(YEAR FROM now())::INTEGER;",
+        "CREATE INDEX IF NOT EXISTS client_docs_season_idx ON client_docs (season);",
+        # extracted_fields is rebuilt as LIST (season) partitions, each split into HASH (client_id) partitions
+        "DROP VIEW IF EXISTS document_fields;",
+        "ALTER TABLE extracted_fields RENAME TO extracted_fields_unpartitioned;",
+        "ALTER SEQUENCE extracted_fields_id_seq OWNED BY NONE;",
+        "ALTER SEQUENCE extracted_fields_id_seq AS BIGINT;",
+        """
+        CREATE TABLE extracted_fields (
+            id BIGINT NOT NULL DEFAULT nextval('extracted_fields_id_seq'),
+            season INTEGER NOT NULL,
+            client_id TEXT,
+            doc_id INTEGER NOT NULL REFERENCES client_docs (id) ON DELETE CASCADE,
+            doc_index INTEGER NOT NULL DEFAULT 0,
+            field_name TEXT,
+            field_value TEXT,
+            confidence REAL,
+            amount NUMERIC
+        ) PARTITION BY LIST (season);
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION ensure_extracted_fields_season(target_season INTEGER) RETURNS VOID AS $$
+        DECLARE
+            season_table TEXT := 'extracted_fields_s' || target_season;
+        BEGIN
+            IF to_regclass(season_table) IS NOT NULL THEN
+                RETURN;
+            END IF;
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF extracted_fields FOR VALUES IN (%s) PARTITION BY HASH (client_id)',
+                season_table, target_season
+            );
+            FOR remainder IN 0 .. {CLIENT_PARTITIONS} - 1 LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES WITH (MODULUS %s, REMAINDER %s)',
+                    season_table || '_p' || remainder, season_table, {CLIENT_PARTITIONS}, remainder
+                );
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        # Detached season tables move to the archive schema, where they stay queryable but out of every plan
+        f"""
+        CREATE OR REPLACE FUNCTION archive_extracted_fields_season(target_season INTEGER) RETURNS VOID AS $$
+        DECLARE
+            season_table TEXT := 'extracted_fields_s' || target_season;
+        BEGIN
+            CREATE SCHEMA IF NOT EXISTS archive;
+            EXECUTE format('ALTER TABLE extracted_fields DETACH PARTITION %I', season_table);
+            FOR remainder IN 0 .. {CLIENT_PARTITIONS} - 1 LOOP
+                EXECUTE format('ALTER TABLE %I SET SCHEMA archive', season_table || '_p' || remainder);
+            END LOOP;
+            EXECUTE format('ALTER TABLE %I SET SCHEMA archive', season_table);
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        """
+        SELECT ensure_extracted_fields_season(season)
+        FROM (
+            SELECT DISTINCT season FROM client_docs
+            UNION
+            SELECT EXTRACT(YEAR FROM now())::INTEGER
+        ) seasons;
+        """,
+        """
+        INSERT INTO extracted_fields (id, season, client_id, doc_id, doc_index, field_name, field_value, confidence, amount)
+        SELECT f.id, d.season, f.client_id, f.doc_id, f.doc_index, f.field_name, f.field_value, f.confidence, f.amount
+        FROM extracted_fields_unpartitioned f
+        JOIN client_docs d ON d.id = f.doc_id;
+        """,
+        "DROP TABLE extracted_fields_unpartitioned;",
+        "ALTER SEQUENCE extracted_fields_id_seq OWNED BY extracted_fields.id;",
+        # Indexes on the parent are created on every current and future partition
+        "CREATE UNIQUE INDEX extracted_fields_field_key ON extracted_fields (client_id, season, doc_id, doc_index, field_name);",
+        "CREATE INDEX extracted_fields_doc_id_idx ON extracted_fields (doc_id, doc_index, id);",
+        """
+        CREATE VIEW document_fields AS
+        SELECT f.doc_id, f.client_id, f.doc_index, f.id::BIGINT AS ordinal,
+               f.field_name, f.field_value, f.confidence, f.amount
+        FROM extracted_fields f
+        UNION ALL
+        SELECT m.doc_id, m.client_id, m.doc_index, (e.value->>'o')::BIGINT,
+               e.key, e.value->>'v', (e.value->>'c')::REAL, (e.value->>'a')::NUMERIC
+        FROM document_field_maps m
+        CROSS JOIN LATERAL jsonb_each(m.fields) e;
+        """,
+    ]),
+    (10, [
+        # change_seq is taken when a row is written, not when its transaction commits, so it cannot tell a
+        # reader which changes are final. The writing transaction's id can: every id below the snapshot xmin
+        # has committed or aborted, and the change feed only reads up to there.
+        "ALTER TABLE client_docs ADD COLUMN IF NOT EXISTS change_xid XID8 NOT NULL DEFAULT '0';",
+        "DROP INDEX IF EXISTS client_docs_client_change_seq_idx;",
+        "CREATE INDEX IF NOT EXISTS client_docs_client_change_xid_idx ON client_docs (client_id, change_xid, change_seq);",
+        """
+        CREATE OR REPLACE FUNCTION client_docs_touch() RETURNS trigger AS $$
+        BEGIN
+            NEW.change_seq := nextval('client_docs_change_seq');
+            NEW.change_xid := pg_current_xact_id();
+            NEW.updated_at := now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+    ]),
+    (11, [
+        # A running job belongs to the process holding its lease; others only resume it once the lease expires
+        """
+        ALTER TABLE jobs
+            ADD COLUMN IF NOT EXISTS owner TEXT,
+            ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ;
+        """,
+    ]),
+    (12, [
+        # Concurrent first writes to a season, or workers starting together, all passed the existence check and
+        # raced to create the partition; the transaction-scoped advisory lock lets one create it and the rest see it
+        f"""
+        CREATE OR REPLACE FUNCTION ensure_extracted_fields_season(target_season INTEGER) RETURNS VOID AS $$
+        DECLARE
+            season_table TEXT := 'extracted_fields_s' || target_season;
+        BEGIN
+            IF to_regclass(season_table) IS NOT NULL THEN
+                RETURN;
+            END IF;
+            PERFORM pg_advisory_xact_lock(hashtext(season_table));
+            -- A newly taken table lock reads pending catalog invalidations, so the re-check sees a partition
+            -- that the transaction we waited for created
+            LOCK TABLE extracted_fields IN ACCESS SHARE MODE;
+            IF to_regclass(season_table) IS NOT NULL THEN
+                RETURN;
+            END IF;
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF extracted_fields FOR VALUES IN (%s) PARTITION BY HASH (client_id)',
+                season_table, target_season
+            );
+            FOR remainder IN 0 .. {CLIENT_PARTITIONS} - 1 LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES WITH (MODULUS %s, REMAINDER %s)',
+                    season_table || '_p' || remainder, season_table, {CLIENT_PARTITIONS}, remainder
+                );
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+    ]),
+]
+
+async def migrate(conn):
+    """Apply every migration newer than the recorded schema version. Returns the resulting version."""
+    await conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    """)
+    async with conn.transaction():
+        # Serialize concurrent workers starting up against the same database
+        await conn.execute("LOCK TABLE schema_migrations IN EXCLUSIVE MODE;")
+        current_version = await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_migrations;")
+        for version, statements in MIGRATIONS:
+            if version <= current_version:
+                continue
+            for statement in statements:
+                await conn.execute(statement)
+            await conn.execute("INSERT INTO schema_migrations (version) VALUES ($1);", version)
+            print(f"Applied schema migration {version}")
+            current_version = version
+    return current_version
+
+async def ensure_season_partitions(conn, seasons=None):
+    """Create extracted_fields partitions for the given seasons; by default this season and the next.
+
+    Raises ValueError for an archived season instead of creating an empty partition beside its archived fields.
+    """
+    if seasons is None:
+        current_season = await conn.fetchval("SELECT EXTRACT(YEAR FROM now())::INTEGER;")
+        seasons = [current_season, current_season + 1]
+    for season in seasons:
+        season = int(season)
+        if await conn.fetchval("SELECT to_regclass('archive.extracted_fields_s' || $1::text) IS NOT NULL;", season):
+            raise ValueError(
+                f"Season {season} is archived in archive.extracted_fields_s{season}; "
+                f"its documents cannot be re-extracted unless the season is dropped"
+            )
+        await conn.execute("SELECT ensure_extracted_fields_season($1);", season)
+
+async def archive_season(conn, season):
+    """Detach a finished season's fields into the archive schema. Live queries stop seeing them."""
+    await conn.execute("SELECT archive_extracted_fields_season($1);", int(season))
+    print(f"Archived extracted_fields season {season}")
+
+async def drop_season(conn, season):
+    """Purge a season: its field partitions, attached or archived, are dropped and its documents deleted."""
+    season = int(season)
+    async with conn.transaction():
+        await conn.execute(f"DROP TABLE IF EXISTS extracted_fields_s{season};")
+        if await conn.fetchval("SELECT to_regnamespace('archive') IS NOT NULL;"):
+            await conn.execute(f"DROP TABLE IF EXISTS archive.extracted_fields_s{season};")
+        await conn.execute("DELETE FROM client_docs WHERE season = $1;", season)
+    print(f"Dropped extracted_fields season {season}")
+
+async def migrate_with_pool():
+    conn = await acquire()
+    try:
+        version = await migrate(conn)
+        if version >= 9:
+            # Created up front so the first writes of a season rarely create it; Database covers the rest
+            await ensure_season_partitions(conn)
+        return version
+    finally:
+        await release(conn)
+
+async def main(argv):
+    command = argv[1] if len(argv) > 1 else 'migrate'
+    await create_pool(min_size=1, max_size=1)
+    try:
+        if command == 'migrate':
+            version = await migrate_with_pool()
+            print(f"Schema is at version {version}")
+        elif command in ('archive-season', 'drop-season') and len(argv) == 3:
+            conn = await acquire()
+            try:
+                if command == 'archive-season':
+                    await archive_season(conn, argv[2])
+                else:
+                    await drop_season(conn, argv[2])
+            finally:
+                await release(conn)
+        else:
+            print("Usage: schema.py [migrate | archive-season <year> | drop-season <year>]")
+    finally:
+        await close_pool()
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv))
@@ -1,27 +1,154 @@
-import asyncpg
 import json
+import os
+from db_pool import acquire, release
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+CLIENT_DOCS_COLUMNS = ('id', 'client_id', 'doc_url', 'doc_name', 'doc_status', 'doc_type', 'container_name', 'access_id')
+# Selectable on request but not returned by default
+CLIENT_DOCS_EXTRA_COLUMNS = ('change_seq',)
+# Columns the table can be filtered and sorted by; each has a (client_id, column, id) index for the keyset
+CLIENT_DOCS_KEY_COLUMNS = ('doc_status', 'doc_type')
+
+CLIENT_DATA_PAGE_SIZE = int(os.environ.get('CLIENT_DATA_PAGE_SIZE', 500))
+CLIENT_DATA_MAX_PAGE_SIZE = int(os.environ.get('CLIENT_DATA_MAX_PAGE_SIZE', 5000))
+
+def encode_json(payload):
+    """Serialize a response body once, to bytes."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
 
 class TableBuilder:
     async def __aenter__(self):
-        self.conn = await asyncpg.connect(
-            database="postgres",
-            user="postgres",
-            password="newpassword",
-            host="localhost",
-            port="5432"
-        )
+        self.conn = await acquire()
         return self
 
-    async def fetch_client_data(self, client_id):
-        records = await self.conn.fetch("SELECT * FROM client_docs WHERE client_id = $1;", client_id)
+    async def fetch_client_data(self, client_id, columns=None, filters=None, sort=None, descending=False, cursor=None, limit=None):
+        """One page of a client's documents, ordered by (sort column, id).
+
+        filters maps doc_status/doc_type to a value or a list of values. cursor is the next_cursor of the
+        previous page; next_cursor is None on the last page. change_cursor is where a change feed for this
+        client should start so no update made after the page was read is missed. Raises ValueError for
+        unknown columns.
+        """
+        columns = self.validate_columns(columns)
+        if sort is not None and sort not in CLIENT_DOCS_KEY_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort}")
+        filters = filters or {}
+        for column in filters:
+            if column not in CLIENT_DOCS_KEY_COLUMNS:
+                raise ValueError(f"Cannot filter by {column}")
+        limit = min(max(int(limit or CLIENT_DATA_PAGE_SIZE), 1), CLIENT_DATA_MAX_PAGE_SIZE)
+
+        # id, and the sort column, are always selected because the next cursor is built from them
+        selected = list(dict.fromkeys(['id', *([sort] if sort else []), *columns]))
+
+        args = [client_id]
+        conditions = ["client_id = $1"]
+        for column, values in filters.items():
+            if not isinstance(values, list):
+                values = [values]
+            args.append(values)
+            conditions.append(f"{column} = ANY(${len(args)}::text[])")
 
-        client_docs_data = [dict(record) for record in records]
+        # NULLs sort as '' so row comparisons on the keyset stay well defined
+        key = ["id"] if sort is None else [f"COALESCE({sort}, '')", "id"]
+        comparison = '<' if descending else '>'
+        if cursor is not None:
+            if len(cursor) != len(key):
+                raise ValueError("Cursor does not match the sort order")
+            placeholders = []
+            for key_value in cursor:
+                args.append(key_value)
+                placeholders.append(f"${len(args)}")
+            if sort is not None:
+                placeholders[0] = f"COALESCE({placeholders[0]}::text, '')"
+            else:
+                placeholders[0] = f"{placeholders[0]}::integer"
+            conditions.append(f"({', '.join(key)}) {comparison} ({', '.join(placeholders)})")
 
-        final_data = {
-            'client_docs': client_docs_data,
+        direction = ' DESC' if descending else ''
+        args.append(limit + 1)
+        query = f"""
+        SELECT {', '.join(selected)}
+        FROM client_docs
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {', '.join(expression + direction for expression in key)}
+        LIMIT ${len(args)}
+        """
+        # Read before the page, so changes racing with it are repeated by the feed rather than lost
+        change_cursor = await self.current_change_cursor()
+        records = await self.conn.fetch(query, *args)
+
+        # One row past the page tells us whether another page exists
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            last = records[-1]
+            next_cursor = [last['id']] if sort is None else [last[sort], last['id']]
+
+        return {
+            'client_docs': [{column: record[column] for column in columns} for record in records],
+            'next_cursor': next_cursor,
+            'change_cursor': change_cursor,
         }
 
-        return json.dumps(final_data)
+    async def fetch_client_changes(self, client_id, since, columns=None, limit=None):
+        """Documents of a client inserted or updated after the change cursor `since`, oldest change first.
+
+        The cursor is a transaction id. Only changes of transactions older than every one still in flight are
+        returned, so a transaction that commits late cannot land behind a cursor that already moved past it.
+        change_cursor is the since value for the next call; has_more means the limit cut the batch short. One
+        transaction's changes always come in the same batch.
+        """
+        columns = self.validate_columns(columns)
+        limit = min(max(int(limit or CLIENT_DATA_PAGE_SIZE), 1), CLIENT_DATA_MAX_PAGE_SIZE)
+        since = int(since)
+        selected = ', '.join(['change_xid::text::bigint AS change_xid', *dict.fromkeys(columns)])
+        horizon = await self.current_change_cursor()
+        records = await self.conn.fetch(f"""
+        SELECT {selected}
+        FROM client_docs
+        WHERE client_id = $1 AND change_xid >= $2::bigint::text::xid8 AND change_xid < $3::bigint::text::xid8
+        ORDER BY change_xid, change_seq
+        LIMIT $4
+        """, client_id, since, horizon, limit + 1)
+
+        has_more = len(records) > limit
+        if has_more:
+            # Stop before the transaction the limit cut into; the next call starts with it
+            horizon = records[limit]['change_xid']
+            records = [record for record in records[:limit] if record['change_xid'] < horizon]
+            if not records:
+                # A single transaction larger than the limit is returned whole
+                records = await self.conn.fetch(f"""
+                SELECT {selected}
+                FROM client_docs
+                WHERE client_id = $1 AND change_xid = $2::bigint::text::xid8
+                ORDER BY change_seq
+                """, client_id, horizon)
+                horizon += 1
+        return {
+            'client_docs': [{column: record[column] for column in columns} for record in records],
+            'change_cursor': max(since, horizon),
+            'has_more': has_more,
+        }
+
+    async def current_change_cursor(self):
+        """The oldest transaction still in flight. Every change made before it is final and already visible."""
+        return await self.conn.fetchval("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint;")
+
+    @staticmethod
+    def validate_columns(columns):
+        columns = list(columns or CLIENT_DOCS_COLUMNS)
+        unknown = [column for column in columns if column not in CLIENT_DOCS_COLUMNS + CLIENT_DOCS_EXTRA_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        return columns
 
     async def __aexit__(self, exc_type, exc, tb):
-        await self.conn.close()
\ No newline at end of file
+        await release(self.conn)
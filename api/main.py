@@ -1,27 +1,84 @@
-from quart import Quart, request, jsonify, Response, send_file
+from quart import Quart, request, jsonify, Response
 from quart_cors import cors
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import FileStorage
 from uploader import Uploader
 from extractor import Extractor
-from azure.storage.blob.aio import BlobServiceClient
+from azure_clients import init_clients, close_clients, get_blob_service_client
 import azure_credentials 
 import aiofiles
-from io import BytesIO
-from copyfunc import copy_worksheet
 from database import Database
-from FOFexport import process_FOF
+from db_pool import create_pool, close_pool, pool_stats
+from queries import query_registry
+from schema import migrate_with_pool
+from job_store import JobStore, JOB_LEASE_SECONDS
+from change_feed import ChangeFeed
+from FOFstream import FOFWorkbookStream
+from FOFtemplate import get_fof_template
 from sorter import Sorter
+from local_classifier import classify_locally
 from form_mapping_utils import upload_bucket_mapping
-from table_builder import TableBuilder
+from ui_table_builder import TableBuilder, encode_json
+from scheduler import JobScheduler
+from analysis_cache import analysis_cache, hash_file
 import xml.etree.ElementTree as ET
 import re
+import os
+import json
+import shutil
+import tempfile
 import asyncio
-import openpyxl
-import io
+from contextlib import aclosing
 
 app = Quart(__name__)
 app = cors(app)
 
+# Shared across requests so stage limits and tenant fairness hold for the whole process
+scheduler = JobScheduler()
+job_store = JobStore()
+change_feed = ChangeFeed()
+
+# Open change streams send a comment this often to keep proxies from closing them, and re-check for changes
+CHANGE_FEED_HEARTBEAT_SECONDS = float(os.environ.get('CHANGE_FEED_HEARTBEAT_SECONDS', 15))
+
+# Submitted job files larger than this are spooled to disk until the background upload runs
+JOB_SPOOL_MAX_MEMORY = int(os.environ.get('JOB_SPOOL_MAX_MEMORY', 1024 * 1024))
+
+@app.before_serving
+async def startup():
+    await create_pool()
+    await migrate_with_pool()
+    await init_clients()
+    await change_feed.start()
+    app.job_maintenance = asyncio.create_task(maintain_jobs())
+
+@app.after_serving
+async def shutdown():
+    app.job_maintenance.cancel()
+    await change_feed.stop()
+    await close_clients()
+    await close_pool()
+
+@app.route('/pool_stats', methods=['GET'])
+async def get_pool_stats():
+    return jsonify(pool_stats())
+
+@app.route('/query_stats', methods=['GET'])
+async def get_query_stats():
+    return jsonify(query_registry.stats())
+
+@app.route('/scheduler_stats', methods=['GET'])
+async def get_scheduler_stats():
+    return jsonify(scheduler.stats())
+
+@app.route('/analysis_cache_stats', methods=['GET'])
+async def get_analysis_cache_stats():
+    return jsonify(analysis_cache.stats())
+
+@app.route('/change_feed_stats', methods=['GET'])
+async def get_change_feed_stats():
+    return jsonify(change_feed.stats())
+
 @app.route('/process_doc', methods=['POST'])
 async def process_doc():
     form = await request.form
@@ -30,24 +87,132 @@ async def process_doc():
     form_types = form.getlist('formTypes[]')
     uploaded_files = (await request.files).getlist('files[]')
 
-    tasks = []
-
-    for uploaded_file, form_type in zip(uploaded_files, form_types):
-        tasks.append(handle_file(client_id, uploaded_file, form_type, version_id))
+    tasks = [
+        handle_file_safely(client_id, uploaded_file, form_type, version_id)
+        for uploaded_file, form_type in zip(uploaded_files, form_types)
+    ]
+
+    # Streaming mode sends one NDJSON line per file as soon as that file finishes
+    if form.get('stream') == 'true':
+        async def generate():
+            # A client that goes away does not abandon files already being uploaded or extracted
+            async for index, result in scheduler.as_completed(tasks, cancel_pending=False):
+                yield json.dumps({"index": index, **result}) + "\n"
+        response = Response(generate(), mimetype='application/x-ndjson')
+        response.timeout = None  # The whole batch is processed while the body is sent
+        return response
 
-    responses = await asyncio.gather(*tasks)
+    responses = [None] * len(tasks)
+    async for index, result in scheduler.as_completed(tasks):
+        responses[index] = result
 
     return jsonify(responses)
 
+async def handle_file_safely(client_id, uploaded_file, form_type, version_id):
+    try:
+        return await handle_file(client_id, uploaded_file, form_type, version_id)
+    except Exception as e:
+        print(f"An error occurred while processing '{uploaded_file.filename}': {e}")
+        return {"status": "Error", "error": str(e)}
+
+@app.route('/jobs', methods=['POST'])
+async def submit_job():
+    form = await request.form
+    client_id = form['clientID']
+    version_id = form['versionID']
+    form_types = form.getlist('formTypes[]')
+    uploaded_files = (await request.files).getlist('files[]')
+
+    # Request files are gone once the response is sent, so spool a copy for the background upload
+    files_by_index = {}
+    for index, (uploaded_file, form_type) in enumerate(zip(uploaded_files, form_types)):
+        # Copying may spill to disk, so keep it off the event loop
+        spooled_file = await asyncio.to_thread(spool_file, uploaded_file.stream)
+        files_by_index[index] = FileStorage(spooled_file, filename=uploaded_file.filename)
+
+    job_id, job_files = await job_store.create_job(
+        client_id,
+        version_id,
+        [(secure_filename(uploaded_file.filename), form_type) for uploaded_file, form_type in zip(uploaded_files, form_types)]
+    )
+    app.add_background_task(run_job, job_id, client_id, version_id, job_files, files_by_index)
+
+    return jsonify({"job_id": job_id, "status": "running", "total": len(job_files)}), 202
+
+def spool_file(stream):
+    spooled_file = tempfile.SpooledTemporaryFile(max_size=JOB_SPOOL_MAX_MEMORY)
+    stream.seek(0)
+    shutil.copyfileobj(stream, spooled_file)
+    spooled_file.seek(0)
+    return spooled_file
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+async def get_job(job_id):
+    job = await job_store.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+async def maintain_jobs():
+    """Renew the leases on this process's jobs and resume jobs whose owner stopped, this one's predecessor included."""
+    while True:
+        try:
+            await job_store.renew_leases()
+            for job in await job_store.claim_unfinished_jobs():
+                print(f"Resuming job {job['job_id']} with {len(job['files'])} unfinished files")
+                app.add_background_task(run_job, job['job_id'], job['client_id'], job['access_id'], job['files'], {})
+        except Exception as e:
+            print(f"An error occurred while maintaining job leases: {e}")
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+
+async def run_job(job_id, client_id, version_id, job_files, files_by_index):
+    try:
+        await asyncio.gather(*(
+            run_job_file(client_id, version_id, job_file, files_by_index.get(job_file['file_index']))
+            for job_file in job_files
+        ))
+        await job_store.finish_job(job_id)
+    finally:
+        for spooled_file in files_by_index.values():
+            spooled_file.close()
+
+async def run_job_file(client_id, version_id, job_file, uploaded_file):
+    job_file_id = job_file['id']
+    form_type = job_file['form_type']
+    content_hash = None
+    try:
+        blob_url = job_file['blob_url']
+        if blob_url is None:
+            if uploaded_file is None:
+                # Only happens when resuming: the bytes were lost with the previous process
+                await job_store.update_file(job_file_id, 'error', error="Interrupted before upload, please resubmit the file")
+                return
+            await job_store.update_file(job_file_id, 'uploading')
+            content_hash = await asyncio.to_thread(hash_file, uploaded_file)
+            blob_url = await upload_file(client_id, uploaded_file, form_type, version_id)
+            if not blob_url:
+                await job_store.update_file(job_file_id, 'error', error="Upload failed")
+                return
+            await job_store.update_file(job_file_id, 'uploaded', blob_url=blob_url)
+
+        if form_type != 'None':
+            await job_store.update_file(job_file_id, 'extracting')
+            await extract_data(client_id, job_file['file_name'], upload_bucket_mapping[form_type], form_type, version_id, content_hash)
+        await job_store.update_file(job_file_id, 'completed')
+    except Exception as e:
+        print(f"An error occurred while processing job file '{job_file['file_name']}': {e}")
+        await job_store.update_file(job_file_id, 'error', error=str(e))
+
 async def handle_file(client_id, uploaded_file, form_type, version_id):
     filename = secure_filename(uploaded_file.filename)
+    content_hash = await asyncio.to_thread(hash_file, uploaded_file)
     blob_url = await upload_file(client_id, uploaded_file, form_type, version_id)
 
     if not blob_url:
         return {"status": "Error", "error": "Upload failed"}
 
     if form_type != 'None':
-        xml_str = await extract_data(client_id, filename, upload_bucket_mapping[form_type], form_type, version_id)
+        xml_str = await extract_data(client_id, filename, upload_bucket_mapping[form_type], form_type, version_id, content_hash)
         if xml_str:
             return {"status": "Extract Completed", "xml": xml_str}
         else:
@@ -58,17 +223,89 @@ async def handle_file(client_id, uploaded_file, form_type, version_id):
 async def upload_file(client_id, uploaded_file, form_type, version_id):
     bucket_name = upload_bucket_mapping.get(form_type, 'unsorted')
     uploader = Uploader(bucket_name)
-    blob_url = await uploader.upload(client_id, uploaded_file)
+    async with scheduler.stage('upload', client_id):
+        blob_url = await uploader.upload(client_id, uploaded_file)
     if blob_url:
-        database = Database(client_id, blob_url)
-        await database.post2postgres_upload(client_id, blob_url, 'uploaded', form_type, bucket_name, version_id)
+        await record_upload(client_id, blob_url, form_type, bucket_name, version_id)
     return blob_url
 
-async def extract_data(client_id, filename, bucket_name, form_type, version_id):
+async def record_upload(client_id, blob_url, form_type, bucket_name, version_id):
+    database = Database(client_id, blob_url)
+    try:
+        async with scheduler.stage('db_write', client_id):
+            await database.post2postgres_upload(client_id, blob_url, 'uploaded', form_type, bucket_name, version_id)
+    finally:
+        await database.close()
+
+@app.route('/ingest', methods=['POST'])
+async def ingest():
+    form = await request.form
+    client_id = form['clientID']
+    version_id = form['versionID']
+    uploaded_files = (await request.files).getlist('files[]')
+
+    tasks = [ingest_file_safely(client_id, uploaded_file, version_id) for uploaded_file in uploaded_files]
+
+    if form.get('stream') == 'true':
+        async def generate():
+            # A client that goes away does not abandon files already being uploaded or extracted
+            async for index, result in scheduler.as_completed(tasks, cancel_pending=False):
+                yield json.dumps({"index": index, **result}) + "\n"
+        response = Response(generate(), mimetype='application/x-ndjson')
+        response.timeout = None  # The whole batch is processed while the body is sent
+        return response
+
+    responses = [None] * len(tasks)
+    async for index, result in scheduler.as_completed(tasks):
+        responses[index] = result
+
+    return jsonify(responses)
+
+async def ingest_file_safely(client_id, uploaded_file, version_id):
+    try:
+        return await ingest_file(client_id, uploaded_file, version_id)
+    except Exception as e:
+        print(f"An error occurred while ingesting '{uploaded_file.filename}': {e}")
+        return {"status": "Error", "error": str(e), "file_name": uploaded_file.filename}
+
+async def ingest_file(client_id, uploaded_file, version_id):
+    """Upload once, classify from the blob SAS URL, then extract the same blob with the matching model."""
+    filename = secure_filename(uploaded_file.filename)
+    content_hash = await asyncio.to_thread(hash_file, uploaded_file)
+    bucket_name = upload_bucket_mapping['None']
+
+    async with scheduler.stage('upload', client_id):
+        blob_url = await Uploader(bucket_name).upload(client_id, uploaded_file)
+    if not blob_url:
+        return {"status": "Error", "error": "Upload failed", "file_name": filename}
+
+    # Try the local text-layer/filename classifier before paying for OCR
+    form_type = await asyncio.to_thread(classify_locally, uploaded_file.stream, filename)
+    if form_type is None:
+        extractor = Extractor(bucket_name)
+        blob_sas_url, _ = extractor.get_blob_urls(client_id, sanitize_blob_name(filename))
+        async with scheduler.stage('analyze', client_id):
+            sort_result = await Sorter().sort_url(blob_sas_url, content_hash)
+        form_type = sort_result['form_type']
+
+    await record_upload(client_id, blob_url, form_type, bucket_name, version_id)
+
+    if form_type == 'None':
+        return {"status": "Upload Completed", "form_type": form_type, "file_name": filename, "uploaded_file": blob_url}
+
+    # The blob stays in the container it was uploaded to, so extract from there
+    xml_str = await extract_data(client_id, filename, bucket_name, form_type, version_id, content_hash)
+    if xml_str:
+        return {"status": "Extract Completed", "form_type": form_type, "file_name": filename, "xml": xml_str}
+    return {"status": "Empty Extraction", "form_type": form_type, "file_name": filename}
+
+async def extract_data(client_id, filename, bucket_name, form_type, version_id, content_hash=None):
     sanitized_blob_name = sanitize_blob_name(filename)
     extractor = Extractor(bucket_name)
-    extracted_values, blob_sas_url = await extractor.extract(client_id, sanitized_blob_name, form_type)
-    await extractor.update_database(client_id, blob_sas_url, filename, form_type, extracted_values, version_id)
+    async with scheduler.stage('analyze', client_id):
+        extracted_values, blob_sas_url = await extractor.extract(client_id, sanitized_blob_name, form_type, content_hash)
+    async with scheduler.stage('db_write', client_id):
+        await extractor.update_database(client_id, blob_sas_url, filename, form_type, extracted_values, version_id)
     root = ET.Element("W2s")
     for extracted_value in extracted_values:
         w2_element = ET.SubElement(root, "W2")
@@ -94,35 +331,122 @@ async def download_csv(document_id):
     client_id = json_data['clientID']
     db = Database(None, None)
     sanitized_doc_id = sanitize_blob_name(document_id)
-    print(sanitized_doc_id)  
-    csv_content = await db.generate_csv(sanitized_doc_id, client_id)
+    print(sanitized_doc_id)
 
-    await db.close()
+    # The connection is held while the body streams and released when the generator finishes
+    response = Response(stream_and_close(db, db.iter_document_csv(sanitized_doc_id, client_id)), mimetype='text/csv')
+    response.timeout = None  # Rows are read while the body is sent; a cut-off export would look complete
+    response.headers["Content-Disposition"] = f"attachment; filename={document_id}.csv"
 
-    response = Response(csv_content, mimetype='text/csv')
-    response.headers["Content-Disposition"] = f"attachment; filename={document_id}.csv" 
-    
     return response
 
+@app.route('/download_client_csv', methods=['POST'])
+async def download_client_csv():
+    """CSV of the listed documents, or of every document of the client when documentNames is omitted."""
+    json_data = await request.json
+    client_id = json_data['clientID']
+    document_names = json_data.get('documentNames')
+    document_ids = None
+    if document_names is not None:
+        document_ids = [sanitize_blob_name(document_name) for document_name in document_names]
+
+    db = Database(None, None)
+    response = Response(stream_and_close(db, db.iter_client_csv(client_id, document_ids)), mimetype='text/csv')
+    response.timeout = None  # Rows are read while the body is sent; a cut-off export would look complete
+    response.headers["Content-Disposition"] = f"attachment; filename={client_id}_Customs_Data.csv"
+    return response
+
+async def stream_and_close(db, chunks):
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await chunks.aclose()
+        await db.close()
+
 @app.route('/get_client_data', methods=['POST'])
 async def get_client_data():
+    """One page of the client's documents. Pass the returned next_cursor back as cursor for the next page.
+
+    With since=<change_cursor> only the documents changed after that point are returned.
+    """
     json_data = await request.json
     client_id = json_data['clientID']
+    since = json_data.get('since')
 
     # Use async with to ensure proper initialization and cleanup of TableBuilder
-    async with TableBuilder() as table_builder:
-        client_data = await table_builder.fetch_client_data(client_id)
+    try:
+        async with TableBuilder() as table_builder:
+            if since is not None:
+                client_data = await table_builder.fetch_client_changes(
+                    client_id, since, columns=json_data.get('columns'), limit=json_data.get('limit')
+                )
+            else:
+                client_data = await table_builder.fetch_client_data(
+                client_id,
+                columns=json_data.get('columns'),
+                filters=json_data.get('filters'),
+                sort=json_data.get('sort'),
+                descending=json_data.get('descending', False),
+                cursor=json_data.get('cursor'),
+                limit=json_data.get('limit'),
+            )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Serialized once; the page is already plain dicts
+    return Response(encode_json(client_data), mimetype='application/json')
+
+@app.route('/client_changes/<client_id>', methods=['GET'])
+async def client_changes(client_id):
+    """Server-Sent Events stream of a client's document inserts and updates after ?since=<change_cursor>."""
+    # Browsers resend the last event id when they reconnect
+    since = request.headers.get('Last-Event-ID') or request.args.get('since', '0')
+    try:
+        since = int(since)
+    except ValueError:
+        return jsonify({"error": "since must be a change cursor"}), 400
+    columns = request.args.getlist('columns') or None
+    try:
+        columns = TableBuilder.validate_columns(columns)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = Response(stream_client_changes(client_id, since, columns), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None  # Open until the browser disconnects
+    return response
 
-    return jsonify({"data": client_data})
+async def stream_client_changes(client_id, since, columns):
+    # Subscribe before the first read so a change committed in between still wakes us
+    wake = change_feed.subscribe(client_id)
+    try:
+        while True:
+            wake.clear()
+            has_more = True
+            while has_more:
+                async with TableBuilder() as table_builder:
+                    changes = await table_builder.fetch_client_changes(client_id, since, columns=columns)
+                has_more = changes['has_more']
+                since = changes['change_cursor']
+                if changes['client_docs']:
+                    yield f"id: {since}\nevent: changes\ndata: ".encode('utf-8') + encode_json(changes) + b"\n\n"
+            # The heartbeat also re-reads: changes held back behind a transaction that was still running are
+            # picked up here even when nothing notifies after it ends
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=CHANGE_FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+    finally:
+        change_feed.unsubscribe(client_id, wake)
 
 async def process_sort(file):
     filename = secure_filename(file.filename)
     print(f'Processing file: {filename}')
-    file_stream = io.BytesIO(file.read())
 
     sorter = Sorter()
-    result = await sorter.sort(file_stream)
-    file_stream.close()
+    result = await sorter.sort(file.stream, filename)
 
     return {**result, 'file_name': filename}
 
@@ -143,56 +467,50 @@ async def download_all_documents():
         client_id = data['clientID']
         document_names = data['documentNames']
 
-        # Initialize the BlobServiceClient asynchronously
-        blob_service_client = BlobServiceClient.from_connection_string(azure_credentials.CONNECTION_STRING)
+        blob_service_client = get_blob_service_client()
         container_client = blob_service_client.get_container_client(azure_credentials.BUCKET_NAME_CUSTOMS)
 
-        # Download the existing FOFtest.xlsx
+        # Parsed template is cached in process and only re-downloaded when its ETag changes
         blob_client = container_client.get_blob_client('FOFtemplate.xlsx')
-        fof_test_stream = BytesIO()
-        stream_downloader = await blob_client.download_blob()
-        await stream_downloader.readinto(fof_test_stream)
-        fof_test_stream.seek(0)
-        fof_workbook = openpyxl.load_workbook(fof_test_stream)
+        fof_template = await get_fof_template(blob_client)
 
-        db = Database(None, None)
+        exporter = FOFWorkbookStream(fof_template)
 
-        # Create a new workbook
-        workbook = openpyxl.Workbook()
-        workbook.remove(workbook.active)  # Remove the default sheet
-
-        copy_worksheet(fof_workbook, workbook, 'Sheet1') 
-
-        for document_name in document_names:
-            sanitized_name = sanitize_blob_name(document_name)
-            original_data, fof_data = await db.generate_sheet_data(sanitized_name, client_id)  
-            
-            # Add original sheet
-            original_sheet = workbook.create_sheet(title=sanitized_name)
-            for row in original_data:
-                original_sheet.append(row)
-            
-            # Add FOF sheet
-            fof_sheet = workbook.create_sheet(title=f"FOF_{sanitized_name}")
-            for row in fof_data:
-                fof_sheet.append(row)
-
-        fof_sheet_objects = [workbook[sheet_name] for sheet_name in workbook.sheetnames if 'FOF_' in sheet_name]
-        
-        process_FOF(workbook, fof_sheet_objects) 
-
-        # Save the workbook to a BytesIO object
-        output_stream = BytesIO()
-        workbook.save(output_stream)
-        output_stream.seek(0)
-
-        # Save the workbook to a temporary file
-        async with aiofiles.tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-            await tmp.write(output_stream.getvalue())
-            await tmp.flush()
-            response = await send_file(tmp.name, as_attachment=True, attachment_filename=f"{client_id}_Customs_Batch_Data.xlsx")
+        db = Database(None, None)
+        try:
+            sanitized_names = [sanitize_blob_name(document_name) for document_name in document_names]
+            # One query for every document, grouped per document as the rows arrive. aclosing ends the cursor and
+            # its transaction before the connection is released, even when a sheet fails to build
+            async with aclosing(db.iter_sheet_data(sanitized_names, client_id)) as sheets:
+                async for sanitized_name, original_data, fof_data in sheets:
+                    # Sheets are flushed to disk per document; only the FOF_Data row is kept in memory
+                    exporter.add_document(sanitized_name, original_data, fof_data)
+        finally:
+            await db.close()
+
+        # Finishing the zip is CPU-bound, so keep it off the event loop
+        output_fd, output_path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(output_fd)
+        try:
+            await asyncio.to_thread(exporter.save, output_path)
+        except Exception:
+            os.remove(output_path)
+            raise
+
+        response = Response(stream_file_and_remove(output_path), mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response.headers["Content-Disposition"] = f"attachment; filename={client_id}_Customs_Batch_Data.xlsx"
         return response
 
+async def stream_file_and_remove(path, chunk_size=64 * 1024):
+    try:
+        async with aiofiles.open(path, 'rb') as export_file:
+            while True:
+                chunk = await export_file.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
 
 
 if __name__ == "__main__":
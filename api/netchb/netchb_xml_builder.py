@@ -9,8 +9,11 @@ class NetchbXMLBuilder:
         self.db = Database(client_id, None)  # Initialize with client_id only
 
     async def build_xml(self):
-        # Fetch field values from the database
-        field_data = await self.db.get_field_values(self.client_id, self.doc_type)
+        # Fetch field values from the database, handing the pooled connection back right away
+        try:
+            field_data = await self.db.get_field_values(self.client_id, self.doc_type)
+        finally:
+            await self.db.close()
         
         for field_name, field_value in field_data:
             mapped_field = netchb_term_matching.get(field_name)
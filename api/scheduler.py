@@ -0,0 +1,119 @@
+import asyncio
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Per-stage concurrency limits, overridable from the environment
+STAGE_LIMITS = {
+    'upload': int(os.environ.get('UPLOAD_CONCURRENCY', 8)),
+    'analyze': int(os.environ.get('ANALYZE_CONCURRENCY', 4)),
+    'db_write': int(os.environ.get('DB_WRITE_CONCURRENCY', 4)),
+}
+
+class FairStage:
+    """Concurrency limit for one pipeline stage. Freed slots go to waiting tenants round-robin."""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.in_use = 0
+        self.waiters = {}  # tenant -> deque of futures waiting for a slot
+        self.tenant_order = deque()  # tenants with waiters, in round-robin order
+
+    async def acquire(self, tenant):
+        if self.in_use < self.limit and not self.tenant_order:
+            self.in_use += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        if tenant not in self.waiters:
+            self.waiters[tenant] = deque()
+            self.tenant_order.append(tenant)
+        self.waiters[tenant].append(future)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled, so pass it on
+                self.release()
+            else:
+                self._remove_waiter(tenant, future)
+            raise
+
+    def release(self):
+        while self.tenant_order:
+            tenant = self.tenant_order.popleft()
+            queue = self.waiters[tenant]
+            future = queue.popleft()
+            if queue:
+                # Tenant still has work waiting, send it to the back of the line
+                self.tenant_order.append(tenant)
+            else:
+                del self.waiters[tenant]
+            if not future.done():
+                # Hand the slot straight to the waiter, in_use stays the same
+                future.set_result(None)
+                return
+        self.in_use -= 1
+
+    def _remove_waiter(self, tenant, future):
+        queue = self.waiters.get(tenant)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        if not queue:
+            del self.waiters[tenant]
+            self.tenant_order.remove(tenant)
+
+    @asynccontextmanager
+    async def slot(self, tenant):
+        await self.acquire(tenant)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        return {
+            'limit': self.limit,
+            'in_use': self.in_use,
+            'waiting': sum(len(queue) for queue in self.waiters.values()),
+        }
+
+class JobScheduler:
+    def __init__(self, limits=None):
+        limits = {**STAGE_LIMITS, **(limits or {})}
+        self.stages = {name: FairStage(name, limit) for name, limit in limits.items()}
+        self.detached = set()  # Tasks left running after their caller stopped waiting
+
+    def stage(self, name, tenant):
+        """Async context manager holding one slot of the named stage for a tenant."""
+        return self.stages[name].slot(tenant)
+
+    async def as_completed(self, coroutines, cancel_pending=True):
+        """Run coroutines concurrently and yield (index, result) pairs as each one finishes.
+
+        If the caller stops early, unfinished coroutines are cancelled, or with cancel_pending=False left to finish.
+        """
+        tasks = {asyncio.ensure_future(coroutine): index for index, coroutine in enumerate(coroutines)}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield tasks[task], task.result()
+        finally:
+            for task in pending:
+                if cancel_pending:
+                    task.cancel()
+                else:
+                    # The event loop only keeps weak references to tasks
+                    self.detached.add(task)
+                    task.add_done_callback(self.detached.discard)
+
+    def stats(self):
+        return {
+            **{name: stage.stats() for name, stage in self.stages.items()},
+            'detached_tasks': len(self.detached),
+        }
@@ -27,22 +27,53 @@ interface ExtractedField {
 const ClientDataTable: React.FC = () => {
     const { clientID } = useContext(JobContext) as { clientID: string };
     const [clientDocs, setClientDocs] = useState<ClientDoc[]>([]);
+    const [nextCursor, setNextCursor] = useState<(string | number | null)[] | null>(null);
+    const [changeCursor, setChangeCursor] = useState<number | null>(null);
 
     // Extract the data fetching logic into a separate function
-    const fetchData = async () => {
+    // Without a cursor the table is reloaded from the first page; with one the next page is appended
+    const fetchData = async (cursor: (string | number | null)[] | null = null) => {
       if (!clientID) return;
       try {
-        const response = await axios.post("/api/get_client_data", { clientID: clientID });
-        const data = JSON.parse(response.data.data);
-        setClientDocs(data.client_docs);
+        const response = await axios.post("/api/get_client_data", {
+          clientID: clientID,
+          columns: ["id", "client_id", "doc_name", "doc_status", "doc_type", "access_id"],
+          cursor: cursor,
+        });
+        const data = response.data;
+        setClientDocs((previous) => (cursor ? [...previous, ...data.client_docs] : data.client_docs));
+        setNextCursor(data.next_cursor);
+        if (!cursor) {
+          setChangeCursor(data.change_cursor);
+        }
       } catch (error) {
         console.error("An error occurred while fetching data:", error);
       }
     };
 
+    // After the first load only the documents that change are streamed in, replacing rows by id
+    useEffect(() => {
+      if (!clientID || changeCursor === null) return;
+      const columns = ["id", "client_id", "doc_name", "doc_status", "doc_type", "access_id"]
+        .map((column) => `columns=${column}`)
+        .join("&");
+      const source = new EventSource(
+        `/api/client_changes/${encodeURIComponent(clientID)}?since=${changeCursor}&${columns}`
+      );
+      source.addEventListener("changes", (event) => {
+        const changed: ClientDoc[] = JSON.parse((event as MessageEvent).data).client_docs;
+        setClientDocs((previous) => {
+          const byId = new Map(previous.map((doc) => [doc.id, doc]));
+          changed.forEach((doc) => byId.set(doc.id, doc));
+          return Array.from(byId.values());
+        });
+      });
+      return () => source.close();
+    }, [clientID, changeCursor]);
+
     return (
       <div>
-        <Button variant="contained" color="primary" onClick={fetchData}>
+        <Button variant="contained" color="primary" onClick={() => fetchData()}>
           Load Client Data
         </Button>
       <h2>Client Docs</h2>
@@ -70,6 +101,11 @@ const ClientDataTable: React.FC = () => {
           </TableBody>
         </Table>
       </TableContainer>
+      {nextCursor && (
+        <Button variant="outlined" color="primary" onClick={() => fetchData(nextCursor)}>
+          Load More
+        </Button>
+      )}
     </div>
   );
 };
@@ -3,6 +3,7 @@ import { FileStatus } from "./index";
 import { FileWithID } from "./FileSort";
 
 interface ProcessResult {
+  index: number;
   status: string;
 }
 
@@ -32,6 +33,7 @@ export class FileProcessor {
     });
     formData.append("clientID", this.clientID);
     formData.append("versionID", this.versionID);
+    formData.append("stream", "true");
 
     this.files.forEach((file) => {
       if (file.formType !== "None") {
@@ -47,16 +49,27 @@ export class FileProcessor {
         body: formData,
       });
       
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error("Server responded with an error.");
       }
 
-      const results: ProcessResult[] = await response.json();
+      // Results arrive as one JSON line per file, in completion order
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = "";
 
-      results.forEach((result: ProcessResult, index: number) => {
-        const file = this.files[index];
-        this.setFileStatus(file.id, result.status as FileStatus);
-      });
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split("\n");
+        buffered = lines.pop() ?? "";
+        lines.filter((line) => line.trim()).forEach((line) => {
+          const result: ProcessResult = JSON.parse(line);
+          const file = this.files[result.index];
+          this.setFileStatus(file.id, result.status as FileStatus);
+        });
+      }
     } catch (error) {
       this.files.forEach((file) => {
         this.setFileStatus(file.id, FileStatus.Error);